@@ -0,0 +1,130 @@
+import json
+import random
+
+EDGES_PER_LINE = 1000  # Рёбра пишутся строками по столько кортежей, чтобы файл не был одной гигантской строкой
+
+
+def write_edges(path, edges):
+    """
+    Запись графа в формате задач: "(a, b, n), (a, b, n), ...".
+
+    :param edges: итерируемые тройки (откуда, куда, порядковый номер дуги)
+    :return: число записанных рёбер
+    """
+    count = 0
+    line = []
+    with open(path, 'w', encoding='utf-8') as file:
+        for a, b, n in edges:
+            line.append(f"({a}, {b}, {n})")
+            count += 1
+            if len(line) == EDGES_PER_LINE:
+                file.write(", ".join(line) + ",\n")
+                line = []
+        file.write(", ".join(line) + "\n")
+    return count
+
+
+def chain_edges(length):
+    # Длинная цепочка 1 -> 2 -> ... -> length: максимальная глубина при минимальной ширине
+    for node in range(1, length):
+        yield node, node + 1, 1
+
+
+def fan_in_edges(width, depth, fan_in, seed):
+    """
+    Широкий DAG по уровням: на первом уровне width источников, на каждом следующем уровне
+    вдвое меньше вершин (но не меньше одной), у каждой — fan_in случайных родителей с предыдущего
+    уровня. Каждая вершина уровня получает хотя бы одного потомка, поэтому синк единственный.
+    """
+    rng = random.Random(seed)
+    levels = [list(range(1, width + 1))]
+    next_node = width + 1
+    for _ in range(depth - 1):
+        size = max(1, len(levels[-1]) // 2)
+        levels.append(list(range(next_node, next_node + size)))
+        next_node += size
+    if len(levels[-1]) != 1:
+        levels.append([next_node])
+
+    for parents, children in zip(levels, levels[1:]):
+        incoming = {child: set(rng.sample(parents, min(fan_in, len(parents)))) for child in children}
+        used = set().union(*incoming.values())
+        for parent in parents:
+            if parent not in used:
+                incoming[rng.choice(children)].add(parent)
+        for child in children:
+            for order, parent in enumerate(sorted(incoming[child]), start=1):
+                yield parent, child, order
+
+
+def diamond_lattice_edges(rows, columns):
+    # Решётка ромбов: вершина (r, c) ведёт в (r + 1, c) и (r, c + 1). Число путей от источника
+    # до синка растёт экспоненциально, поэтому без общих подвыражений запись не построить
+    def node(row, column):
+        return row * columns + column + 1
+
+    for row in range(rows):
+        for column in range(columns):
+            if row + 1 < rows:
+                yield node(row, column), node(row + 1, column), 1
+            if column + 1 < columns:
+                yield node(row, column), node(row, column + 1), 2
+
+
+def write_operations(path, edges, seed, multiply_share=0.3, constant_range=(0.5, 1.5)):
+    """
+    Файл операций для графа: источникам — числовые константы, остальным вершинам — '*' с долей
+    multiply_share, иначе '+'; вершинам, единственный родитель которых — константа,
+    иногда 'exp' (только от констант, чтобы значения не переполнялись).
+
+    :param edges: те же тройки (откуда, куда, порядок), что были записаны write_edges
+    """
+    rng = random.Random(seed)
+    parents, nodes = {}, {}
+    for a, b, _ in edges:
+        nodes.setdefault(a, None)
+        nodes.setdefault(b, None)
+        parents.setdefault(b, []).append(a)
+
+    operations = {}
+    for node in nodes:
+        if node not in parents:
+            operations[node] = round(rng.uniform(*constant_range), 3)
+        elif (len(parents[node]) == 1 and isinstance(operations.get(parents[node][0]), float)
+              and rng.random() < 0.1):
+            operations[node] = 'exp'
+        else:
+            operations[node] = '*' if rng.random() < multiply_share else '+'
+
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("{\n")
+        file.write(",\n".join(f"    {node} : {operation}" for node, operation in operations.items()))
+        file.write("\n}\n")
+    return len(operations)
+
+
+def write_weights(path, sizes, seed, scale=1.0):
+    # Слои сети: матрица (нейроны, входы) на строку, как в исходных файлах весов
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as file:
+        for inputs, outputs in zip(sizes, sizes[1:]):
+            rows = ([round(rng.uniform(-scale, scale), 4) for _ in range(inputs)] for _ in range(outputs))
+            file.write(", ".join(json.dumps(row) for row in rows) + "\n")
+
+
+def write_input_vectors(path, count, size, seed):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as file:
+        for _ in range(count):
+            file.write(" ".join(str(round(rng.uniform(0, 1), 4)) for _ in range(size)) + "\n")
+
+
+def write_dataset(path, rows, inputs, outputs, seed):
+    # Обучающая выборка "x1, x2 -> y1": выходы — детерминированная функция входов,
+    # чтобы ошибка при обучении действительно убывала
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as file:
+        for _ in range(rows):
+            x = [round(rng.uniform(0, 1), 4) for _ in range(inputs)]
+            y = [1 if sum(x[k::outputs]) > len(x[k::outputs]) / 2 else 0 for k in range(outputs)]
+            file.write(", ".join(map(str, x)) + " -> " + ", ".join(map(str, y)) + "\n")
@@ -0,0 +1,289 @@
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import generators
+from helpers.file_handler import parse_option
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+TOLERANCE = 0.25  # Допустимый рост времени и пиковой памяти относительно эталона
+MIN_SECONDS = 0.01  # Более быстрые этапы по времени не сравниваются: слишком велик шум
+CALIBRATION_REPEAT = 5  # Число замеров калибровочной нагрузки, берётся лучший
+
+# Размеры входных данных для каждого масштаба
+SCALES = {
+    "small": {
+        "chain": 20000, "fan_in": (4096, 8, 4), "lattice": (60, 60),
+        "network": [64, 128, 64, 8], "vectors": 2000, "dataset": (4000, 64, 8), "iterations": 3,
+    },
+    "medium": {
+        "chain": 200000, "fan_in": (65536, 12, 4), "lattice": (200, 200),
+        "network": [256, 512, 256, 16], "vectors": 20000, "dataset": (40000, 256, 16), "iterations": 3,
+    },
+    "large": {
+        "chain": 2000000, "fan_in": (524288, 16, 4), "lattice": (600, 600),
+        "network": [1024, 2048, 1024, 32], "vectors": 100000, "dataset": (200000, 1024, 32), "iterations": 2,
+    },
+}
+
+
+def generate_inputs(directory, scale, seed):
+    """
+    Генерирует все входные файлы масштаба в каталоге directory. При одинаковом seed
+    файлы побайтно совпадают между запусками.
+
+    :return: словарь путей к сгенерированным файлам
+    """
+    sizes = SCALES[scale]
+    paths = {}
+    graphs = {
+        "chain": list(generators.chain_edges(sizes["chain"])),
+        "fan_in": list(generators.fan_in_edges(*sizes["fan_in"], seed=seed)),
+        "lattice": list(generators.diamond_lattice_edges(*sizes["lattice"])),
+    }
+    for name, edges in graphs.items():
+        paths[name] = os.path.join(directory, f"{name}.txt")
+        paths[name + "_operations"] = os.path.join(directory, f"{name}_operations.txt")
+        generators.write_edges(paths[name], edges)
+        # На решётке произведения быстро уходят в бесконечность, поэтому там только сложение
+        generators.write_operations(paths[name + "_operations"], edges, seed,
+                                    multiply_share=0.0 if name == "lattice" else 0.3)
+
+    paths["weights"] = os.path.join(directory, "weights.txt")
+    paths["vectors"] = os.path.join(directory, "vectors.txt")
+    paths["dataset"] = os.path.join(directory, "dataset.txt")
+    generators.write_weights(paths["weights"], sizes["network"], seed, scale=0.1)
+    generators.write_input_vectors(paths["vectors"], sizes["vectors"], sizes["network"][0], seed)
+    rows, inputs, outputs = sizes["dataset"]
+    generators.write_dataset(paths["dataset"], rows, inputs, outputs, seed)
+    return paths
+
+
+def measure(setup, run, repeat):
+    """
+    Время этапа — лучшее из repeat запусков без трассировки памяти; пиковая память — отдельным
+    запуском под tracemalloc (трассировка сильно замедляет выполнение и исказила бы время).
+    Подготовка (setup) каждый раз выполняется заново и в замеры не входит.
+
+    :return: (секунды, пиковая память в байтах)
+    """
+    best = None
+    for _ in range(repeat):
+        state = setup()
+        gc.collect()
+        started = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        del state
+
+    state = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def calibration_workload():
+    # Фиксированная нагрузка того же рода, что и этапы: словари и списки на чистом Python
+    # и умножение матриц NumPy. Её время — единица измерения для сравнения с эталоном
+    import numpy as np
+    table = {}
+    for number in range(200000):
+        table.setdefault(number % 1000, []).append(number)
+    total = sum(len(values) for values in table.values())
+    matrix = np.arange(256 * 256, dtype=np.float64).reshape(256, 256) / 65536
+    for _ in range(20):
+        matrix = np.dot(matrix, matrix.T) / 256
+    return total, float(matrix[0, 0])
+
+
+def calibrate(repeat=CALIBRATION_REPEAT):
+    # Лучшее время калибровочной нагрузки в этом же процессе
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        calibration_workload()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_stages(paths, scale, workdir):
+    # Этапы в порядке выполнения: (имя, подготовка, замеряемое действие)
+    from graph import DirectedGraph
+    from tasks.nntask3 import DirectedGraphWithOperations
+
+    def loaded(name):
+        return lambda: DirectedGraph(paths[name])
+
+    def sorted_graph(name, operations=False):
+        def setup():
+            graph = (DirectedGraphWithOperations(paths[name], paths[name + "_operations"]) if operations
+                     else DirectedGraph(paths[name]))
+            graph.has_cycle(verbose=False)
+            return graph
+        return setup
+
+    stages = []
+    for name in ("chain", "fan_in", "lattice"):
+        stages.append((f"{name}.load_graph", lambda: None, lambda _, name=name: DirectedGraph(paths[name])))
+        stages.append((f"{name}.has_cycle", loaded(name), lambda graph: graph.has_cycle(verbose=False)))
+        # Без общих подвыражений запись решётки экспоненциальна, поэтому везде shared=True
+        stages.append((f"{name}.to_prefix_notation", sorted_graph(name),
+                       lambda graph: graph.to_prefix_notation(shared=True)))
+        stages.append((f"{name}.evaluate_function", sorted_graph(name, operations=True),
+                       lambda graph: graph.evaluate_function(mode="topological")))
+        # Вычисление по уровням в сравнении с последовательным; на цепочке все уровни из одной
+        # вершины, так что это замер накладных расходов на разбиение
+        for pool in ("thread", "process"):
+            stages.append((f"{name}.evaluate_parallel_{pool}", sorted_graph(name, operations=True),
+                           lambda graph, pool=pool: graph.evaluate_function(mode="parallel", pool=pool)))
+
+    def network():
+        from tasks.nntask4 import NeuralNetwork
+        return NeuralNetwork(paths["weights"], paths["vectors"])
+
+    def trainer():
+        from tasks.nntask5 import NeuralNetwork
+        return NeuralNetwork(paths["weights"], paths["dataset"], SCALES[scale]["iterations"],
+                             batch_size=32, shuffle=True, seed=1)
+
+    history_file = os.path.join(workdir, "history.txt")
+    stages.append(("network.forward_pass", network, lambda nn: nn.forward_pass()))
+    stages.append(("network.train", trainer, lambda nn: nn.train(history_file)))
+    return stages
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Сравнение с эталоном: этап считается регрессией, если его время или пиковая память
+    выросли больше чем на tolerance. Время сравнивается в единицах калибровочной нагрузки
+    (поле relative), замеренной в том же процессе, поэтому общая разница в скорости машин
+    не считается регрессией; для эталонов без relative сравниваются секунды.
+    Этапы короче MIN_SECONDS по времени не сравниваются.
+
+    :return: список (этап, что выросло, было, стало)
+    """
+    regressions = []
+    for stage, result in results.items():
+        reference = baseline.get(stage)
+        if reference is None:
+            continue
+        metric = "relative" if "relative" in reference and "relative" in result else "seconds"
+        if (max(result["seconds"], reference["seconds"]) >= MIN_SECONDS
+                and result[metric] > reference[metric] * (1 + tolerance)):
+            regressions.append((stage, metric, reference[metric], result[metric]))
+        if result["peak_bytes"] > reference["peak_bytes"] * (1 + tolerance):
+            regressions.append((stage, "peak_bytes", reference["peak_bytes"], result["peak_bytes"]))
+    return regressions
+
+
+def missing_stages(results, baseline):
+    # Этапы без эталона не сравниваются; о них сообщается, чтобы новый этап не остался без проверки
+    return [stage for stage in results if stage not in baseline]
+
+
+def load_baseline(path, scale):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file).get(scale, {}).get("stages", {})
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, scale, seed, calibration, results):
+    # Эталоны всех масштабов хранятся в одном файле; перезаписывается только текущий
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            stored = json.load(file)
+    except FileNotFoundError:
+        stored = {}
+    stored[scale] = {"seed": seed, "python": platform.python_version(), "calibration_seconds": calibration,
+                     "stages": results}
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(stored, file, ensure_ascii=False, indent=4)
+
+
+# python -m benchmarks.run scale=small
+# python -m benchmarks.run scale=medium output1=results.json update=1 only=chain,network
+#
+# Эталон зависит от машины и версии Python. Время этапов сравнивается в единицах калибровочной
+# нагрузки, замеренной в том же запуске, что сглаживает общую разницу в скорости машин, но
+# соотношение скоростей Python и NumPy у машин разное. Поэтому на новой машине эталон сначала
+# записывается заново (update=1), и дальше запуски сравниваются с ним.
+def main():
+    # input1 - Файл эталона (по умолчанию benchmarks/baseline.json)
+    # output1 - Файл для результатов этого запуска (JSON)
+    # scale - small, medium или large; seed - зерно генераторов; repeat - число замеров времени
+    # update=1 - записать результаты как новый эталон; only - этапы, имена которых начинаются с указанных
+    scale = parse_option("scale", "small")
+    if scale not in SCALES:
+        print(f"Ошибка: неизвестный масштаб {scale}, допустимы {', '.join(SCALES)}")
+        return 1
+    seed = int(parse_option("seed", "1"))
+    repeat = int(parse_option("repeat", "3"))
+    prefixes = tuple(parse_option("only", "").split(",")) if parse_option("only") else ("",)
+    baseline_file = parse_option("input1", BASELINE_FILE)
+    output_file = parse_option("output1")
+
+    workdir = tempfile.mkdtemp(prefix="benchmarks_")
+    try:
+        print(f"Генерация входных данных ({scale}, seed={seed})...")
+        paths = generate_inputs(workdir, scale, seed)
+
+        calibration = calibrate()
+        print(f"{'calibration':32} {calibration * 1000:10.1f} мс")
+        results = {}
+        for stage, setup, run in benchmark_stages(paths, scale, workdir):
+            if not stage.startswith(prefixes):
+                continue
+            # Задачи печатают сообщения о сохранении файлов, в отчёте бенчмарка они не нужны
+            with contextlib.redirect_stdout(io.StringIO()):
+                seconds, peak = measure(setup, run, repeat)
+            results[stage] = {"seconds": seconds, "relative": seconds / calibration, "peak_bytes": peak}
+            print(f"{stage:32} {seconds * 1000:10.1f} мс {peak / 2 ** 20:10.1f} МБ")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if output_file:
+        with open(output_file, 'w', encoding='utf-8') as file:
+            json.dump({"scale": scale, "seed": seed, "calibration_seconds": calibration, "stages": results},
+                      file, ensure_ascii=False, indent=4)
+
+    if parse_option("update", "0") == "1":
+        save_baseline(baseline_file, scale, seed, calibration, results)
+        print(f"Эталон сохранён в {baseline_file}")
+        return 0
+
+    baseline = load_baseline(baseline_file, scale)
+    if not baseline:
+        # Первый запуск на машине записывает эталон, с которым сравниваются следующие
+        save_baseline(baseline_file, scale, seed, calibration, results)
+        print(f"Эталон для масштаба {scale} не найден, результаты сохранены как эталон в {baseline_file}")
+        return 0
+    regressions = compare(results, baseline)
+    for stage in missing_stages(results, baseline):
+        print(f"НЕТ ЭТАЛОНА {stage}: этап не сравнивается, обновить эталон: update=1")
+    for stage, metric, before, after in regressions:
+        print(f"РЕГРЕССИЯ {stage}: {metric} {before:.6g} -> {after:.6g} ({after / before - 1:+.0%})")
+    if not regressions:
+        print("Регрессий относительно эталона нет")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from benchmarks import generators
+from helpers.file_handler import parse_option
+
+
+def reachable(graph, start, target):
+    # Независимая от проверяемого кода проверка достижимости обходом в ширину
+    seen = {start}
+    queue = [start]
+    while queue:
+        node = queue.pop()
+        if node == target:
+            return True
+        for child, _ in graph.get(node, []):
+            if child not in seen:
+                seen.add(child)
+                queue.append(child)
+    return False
+
+
+def edges_of(graph):
+    return sorted((a, b, n) for a, edges in graph.graph.items() for b, n in edges)
+
+
+def order_problems(graph):
+    # Порядок должен содержать каждую вершину графа ровно один раз, позиции в индексе —
+    # совпадать с порядком, и каждая дуга должна вести из более ранней вершины в более позднюю
+    problems = []
+    order = graph.topological_order
+    if sorted(order) != sorted(graph.graph):
+        problems.append("порядок не совпадает с множеством вершин")
+    index = graph._topological_index
+    if index is not None and any(index.get(node) != position for position, node in enumerate(order)):
+        problems.append("индекс позиций не совпадает с порядком")
+    position = {node: number for number, node in enumerate(order)}
+    for a, b, _ in edges_of(graph):
+        if position.get(a, -1) >= position.get(b, -1):
+            problems.append(f"дуга {a} -> {b} нарушает порядок")
+            break
+    return problems
+
+
+def check_incremental_order(directory, seed, nodes=40, insertions=300, backend='dict'):
+    """
+    Случайные вставки и удаления дуг через add_edge / remove_edge (алгоритм Пирса-Келли).
+    После каждой операции порядок должен оставаться топологическим; вставка, замыкающая цикл,
+    должна быть отклонена ровно тогда, когда b уже достигает a, и не менять граф.
+
+    :return: список описаний ошибок (пустой, если всё верно)
+    """
+    from graph import DirectedGraph
+
+    rng = random.Random(seed)
+    # Начальный граф — случайный DAG: дуги только от меньших номеров к большим
+    initial = [(a, b, rng.randint(1, 3)) for a in range(1, nodes + 1) for b in range(a + 1, nodes + 1)
+               if rng.random() < 0.05]
+    path = os.path.join(directory, f"incremental_{backend}.txt")
+    generators.write_edges(path, initial)
+    graph = DirectedGraph(path, backend=backend)
+
+    problems = []
+    rejected = 0
+    for step in range(insertions):
+        if step % 5 == 4 and graph.graph and any(graph.graph.values()):
+            a = rng.choice([node for node, edges in graph.graph.items() if edges])
+            b, n = rng.choice(graph.graph[a])
+            graph.remove_edge(a, b, n)
+        else:
+            # Иногда добавляется новая вершина, которой ещё нет в порядке
+            a = str(rng.randint(1, nodes + 5))
+            b = str(rng.randint(1, nodes + 5))
+            expected_cycle = a == b or reachable(graph.graph, b, a)
+            before = edges_of(graph)
+            try:
+                graph.add_edge(a, b, rng.randint(1, 3))
+                if expected_cycle:
+                    problems.append(f"шаг {step}: дуга {a} -> {b} замыкает цикл, но была добавлена")
+            except ValueError:
+                rejected += 1
+                if not expected_cycle:
+                    problems.append(f"шаг {step}: дуга {a} -> {b} отклонена без цикла")
+                if edges_of(graph) != before:
+                    problems.append(f"шаг {step}: отклонённая дуга {a} -> {b} изменила граф")
+        graph._ensure_mutable()
+        problems.extend(f"шаг {step}: {problem}" for problem in order_problems(graph))
+        if problems:
+            break
+
+    # Итоговый порядок должен совпадать по допустимости с полным пересчётом
+    if not problems and graph.has_cycle(verbose=False):
+        problems.append("после вставок граф содержит цикл")
+    if not problems and rejected == 0:
+        problems.append("ни одна вставка не замкнула цикл — проверка отклонения не выполнена")
+    return problems
+
+
+def check_gradient(directory, seed, tolerance=1e-5):
+    """
+    Производные обратного прохода (gradient) сравниваются с центральными разностями
+    (f(c + h) - f(c - h)) / 2h по каждой константе на случайных графах с общими подвыражениями,
+    сложением, умножением и экспонентой.
+
+    :return: список описаний ошибок (пустой, если всё верно)
+    """
+    from tasks.nntask3 import DirectedGraphWithOperations
+
+    rng = random.Random(seed)
+    shapes = {
+        "fan_in": list(generators.fan_in_edges(32, 4, 3, seed=seed)),
+        "lattice": list(generators.diamond_lattice_edges(5, 5)),
+    }
+    problems = []
+    for name, edges in shapes.items():
+        edges_file = os.path.join(directory, f"gradient_{name}.txt")
+        operations_file = os.path.join(directory, f"gradient_{name}_operations.txt")
+        generators.write_edges(edges_file, edges)
+        # Малые константы, чтобы произведения и экспоненты не переполнялись
+        generators.write_operations(operations_file, edges, rng.randrange(1 << 30), multiply_share=0.4,
+                                    constant_range=(0.1, 0.6))
+        graph = DirectedGraphWithOperations(edges_file, operations_file)
+        graph.has_cycle(verbose=False)
+        gradient = graph.gradient()
+
+        for node, derivative in gradient.items():
+            constant = graph.operations[node]
+            step = 1e-6 * max(1.0, abs(constant))
+            graph.set_operation(node, constant + step)
+            upper = graph.evaluate_function(mode="topological")
+            graph.set_operation(node, constant - step)
+            lower = graph.evaluate_function(mode="topological")
+            graph.set_operation(node, constant)
+            estimate = (upper - lower) / (2 * step)
+            if abs(derivative - estimate) > tolerance * max(1.0, abs(estimate), abs(upper)):
+                problems.append(f"{name}: d/d{node} = {derivative}, разностная оценка {estimate}")
+    return problems
+
+
+CHECKS = {
+    "incremental_order": lambda directory, seed: (check_incremental_order(directory, seed)
+                                                  + check_incremental_order(directory, seed, backend='csr')),
+    "gradient": check_gradient,
+}
+
+
+# python -m benchmarks.verify
+# python -m benchmarks.verify seed=7 rounds=20 only=incremental_order,gradient
+def main():
+    # Проверки правильности алгоритмов, для которых нет эталонных выходных файлов.
+    # seed - начальное зерно; rounds - число прогонов с зёрнами seed, seed+1, ...;
+    # only - проверки, имена которых начинаются с указанных
+    seed = int(parse_option("seed", "1"))
+    rounds = int(parse_option("rounds", "5"))
+    prefixes = tuple(parse_option("only", "").split(",")) if parse_option("only") else ("",)
+
+    directory = tempfile.mkdtemp(prefix="verify_")
+    failed = False
+    try:
+        for name, check in CHECKS.items():
+            if not name.startswith(prefixes):
+                continue
+            problems = []
+            for round_seed in range(seed, seed + rounds):
+                # Задачи печатают сообщения о загрузке и сохранении, в отчёте они не нужны
+                with contextlib.redirect_stdout(io.StringIO()):
+                    problems = check(directory, round_seed)
+                if problems:
+                    print(f"{name:24} ОШИБКА (seed={round_seed}): {problems[0]}")
+                    break
+            else:
+                print(f"{name:24} OK ({rounds} прогонов)")
+            failed = failed or bool(problems)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
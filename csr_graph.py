@@ -0,0 +1,136 @@
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from operator import itemgetter
+
+ID_TYPE = 'i'  # Номера вершин (int32)
+ORDER_TYPE = 'q'  # Порядковые номера дуг (int64)
+OFFSET_TYPE = 'q'  # Смещения отрезков дуг (int64)
+
+
+class CSRAdjacency(Mapping):
+    """
+    Компактное хранение списков смежности в формате CSR.
+
+    Метки вершин отображаются в плотные номера 0..V-1, дуги вершины v лежат в непрерывном
+    отрезке targets[offsets[v]:offsets[v + 1]] и orders[...] и уже отсортированы по порядковому
+    номеру. Снаружи объект ведёт себя как словарь {вершина: [(сосед, порядок), ...]},
+    поэтому методы DirectedGraph работают с ним без изменений.
+    """
+
+    def __init__(self, labels, index, offsets, targets, orders):
+        self.labels = labels
+        self.index = index
+        self.offsets = offsets
+        self.targets = targets
+        self.orders = orders
+
+    def __getitem__(self, node):
+        vertex = self.index[node]
+        start, end = self.offsets[vertex], self.offsets[vertex + 1]
+        labels = self.labels
+        return [(labels[target], order)
+                for target, order in zip(self.targets[start:end], self.orders[start:end])]
+
+    def __contains__(self, node):
+        return node in self.index
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def edge_count(self):
+        return len(self.targets)
+
+    def degrees(self):
+        offsets = self.offsets
+        return [offsets[vertex + 1] - offsets[vertex] for vertex in range(len(self.labels))]
+
+    def kahn(self, in_degree):
+        # Алгоритм Кана на номерах вершин; in_degree изменяется на месте.
+        # Возвращает номера обработанных вершин в топологическом порядке.
+        offsets, targets = self.offsets, self.targets
+        queue = deque(vertex for vertex, degree in enumerate(in_degree) if degree == 0)
+        order = []
+        while queue:
+            vertex = queue.popleft()
+            order.append(vertex)
+            for target in targets[offsets[vertex]:offsets[vertex + 1]]:
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    queue.append(target)
+        return order
+
+
+class CSRGraphBuilder:
+    """
+    Накопление вершин и дуг при загрузке графа с последующей упаковкой в CSR.
+    Дуги хранятся в плоских массивах array, без кортежей и списков на каждую вершину.
+    """
+
+    def __init__(self):
+        self.labels = []
+        self.index = {}
+        self.sources = array(ID_TYPE)
+        self.targets = array(ID_TYPE)
+        self.orders = array(ORDER_TYPE)
+
+    def add_vertex(self, node):
+        vertex = self.index.get(node)
+        if vertex is None:
+            vertex = len(self.labels)
+            self.index[node] = vertex
+            self.labels.append(node)
+        return vertex
+
+    def add_edge(self, a, b, n):
+        source = self.add_vertex(a)
+        target = self.add_vertex(b)
+        self.sources.append(source)
+        self.targets.append(target)
+        self.orders.append(n)
+
+    def build(self):
+        # Прямой индекс: устойчивая сортировка подсчётом по исходной вершине,
+        # затем сортировка отрезка каждой вершины по порядковому номеру
+        forward = pack(self.labels, self.index, self.sources, self.targets, self.orders)
+
+        # Обратный индекс строится по уже упакованному прямому, чтобы при равных порядковых
+        # номерах родители шли в том же порядке, что и в словарном представлении
+        parents = array(ID_TYPE)
+        for vertex in range(len(self.labels)):
+            parents.extend([vertex] * (forward.offsets[vertex + 1] - forward.offsets[vertex]))
+        reverse = pack(self.labels, self.index, forward.targets, parents, forward.orders)
+
+        # Исходные массивы больше не нужны
+        self.sources = self.targets = self.orders = None
+        return forward, reverse
+
+
+def pack(labels, index, sources, targets, orders):
+    vertex_count = len(labels)
+    offsets = array(OFFSET_TYPE, [0]) * (vertex_count + 1)
+    for source in sources:
+        offsets[source + 1] += 1
+    for vertex in range(vertex_count):
+        offsets[vertex + 1] += offsets[vertex]
+
+    positions = offsets[:-1]
+    packed_targets = array(ID_TYPE, [0]) * len(sources)
+    packed_orders = array(ORDER_TYPE, [0]) * len(sources)
+    for source, target, order in zip(sources, targets, orders):
+        position = positions[source]
+        packed_targets[position] = target
+        packed_orders[position] = order
+        positions[source] = position + 1
+
+    for vertex in range(vertex_count):
+        start, end = offsets[vertex], offsets[vertex + 1]
+        if end - start > 1:
+            segment = sorted(zip(packed_orders[start:end], packed_targets[start:end]), key=itemgetter(0))
+            packed_orders[start:end] = array(ORDER_TYPE, [order for order, _ in segment])
+            packed_targets[start:end] = array(ID_TYPE, [target for _, target in segment])
+
+    return CSRAdjacency(labels, index, offsets, packed_targets, packed_orders)
@@ -0,0 +1,128 @@
+import json
+import os
+
+import numpy as np
+
+DATASET_SUFFIX = ".bin"
+DATASET_MAGIC = b"NNDATA1\0"
+HEADER_SIZE = 256  # Фиксированный размер заголовка: его можно дописать после строк данных
+WINDOW_ROWS = 1 << 16  # Размер окна перемешивания по умолчанию (строк)
+
+
+def dataset_path(text_file):
+    return text_file + DATASET_SUFFIX
+
+
+def parse_dataset_line(line):
+    # Строка вида "x1, x2 -> y1, ..."; при неверном формате выбрасывается исключение
+    inputs, outputs = line.split("->")
+    x = [float(i) for i in inputs.strip().split(",")]
+    y = [float(o) for o in outputs.strip().split(",")]
+    return x, y
+
+
+def convert_dataset(text_file, binary_file, dtype, log_error):
+    """
+    Однопроходное преобразование текстовой выборки в двоичную матрицу строк [x | y].
+    Строки пишутся в файл сразу после разбора, поэтому память не зависит от размера выборки.
+    Заголовок фиксированного размера (число строк, размерности, тип, сведения об исходном файле)
+    записывается в конце на зарезервированное в начале файла место.
+
+    :return: число записанных строк
+    """
+    dtype = np.dtype(dtype)
+    rows = 0
+    widths = None
+    temporary_file = binary_file + ".tmp"
+    with open(text_file, 'r', encoding='utf-8') as source, open(temporary_file, 'wb') as target:
+        target.write(b'\0' * HEADER_SIZE)
+        for line_number, line in enumerate(source, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                x, y = parse_dataset_line(line)
+                if widths is None:
+                    widths = (len(x), len(y))
+                elif (len(x), len(y)) != widths:
+                    raise ValueError("размерность не совпадает с первой строкой")
+            except Exception:
+                log_error(f"Строка {line_number}: некорректный формат строки обучающей выборки: '{line}'")
+                continue
+            target.write(np.array(x + y, dtype=dtype).tobytes())
+            rows += 1
+
+        stat = os.stat(text_file)
+        header = {
+            "rows": rows,
+            "inputs": widths[0] if widths else 0,
+            "outputs": widths[1] if widths else 0,
+            "dtype": dtype.str,
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+        }
+        encoded = DATASET_MAGIC + json.dumps(header).encode('utf-8')
+        if len(encoded) > HEADER_SIZE:
+            raise ValueError("заголовок выборки не помещается в отведённое место")
+        target.seek(0)
+        target.write(encoded.ljust(HEADER_SIZE, b' '))
+    os.replace(temporary_file, binary_file)
+    return rows
+
+
+def read_dataset_header(binary_file):
+    with open(binary_file, 'rb') as file:
+        raw = file.read(HEADER_SIZE)
+    if not raw.startswith(DATASET_MAGIC):
+        return None
+    return json.loads(raw[len(DATASET_MAGIC):].decode('utf-8'))
+
+
+def open_dataset(text_file, dtype, log_error):
+    """
+    Возвращает (X, Y) — представления поверх memory-mapped двоичной матрицы. Если двоичного файла
+    нет или он устарел относительно текстового (размер, время изменения, тип), он создаётся заново.
+    """
+    binary_file = dataset_path(text_file)
+    dtype = np.dtype(dtype)
+    header = read_dataset_header(binary_file) if os.path.exists(binary_file) else None
+    stat = os.stat(text_file)
+    if (header is None or header["dtype"] != dtype.str or header["source_size"] != stat.st_size
+            or header["source_mtime_ns"] != stat.st_mtime_ns):
+        convert_dataset(text_file, binary_file, dtype, log_error)
+        header = read_dataset_header(binary_file)
+
+    if header["rows"] == 0:
+        return None, None
+    width = header["inputs"] + header["outputs"]
+    data = np.memmap(binary_file, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(header["rows"], width))
+    return data[:, :header["inputs"]], data[:, header["inputs"]:]
+
+
+def iter_window_batches(X, Y, batch_size, rng, window_rows=WINDOW_ROWS):
+    """
+    Пакеты с перемешиванием через буфер: выборка читается непрерывными окнами по window_rows
+    строк в случайном порядке окон, строки окна перемешиваются в памяти. Чтение с диска
+    остаётся последовательным внутри окна, а в памяти одновременно лежит не больше одного окна
+    и хвоста предыдущего. Возвращает тройки (X_пакета, Y_пакета, срез).
+    """
+    count = len(X)
+    starts = np.arange(0, count, window_rows)
+    tail_x = tail_y = None
+    for start in starts[rng.permutation(len(starts))]:
+        window_x = np.array(X[start:start + window_rows])
+        window_y = np.array(Y[start:start + window_rows])
+        if tail_x is not None:
+            # Неполный пакет предыдущего окна переносится в следующее
+            window_x = np.concatenate((tail_x, window_x))
+            window_y = np.concatenate((tail_y, window_y))
+        order = rng.permutation(len(window_x))
+        window_x, window_y = window_x[order], window_y[order]
+
+        full = len(window_x) - len(window_x) % batch_size
+        for position in range(0, full, batch_size):
+            yield window_x, window_y, slice(position, position + batch_size)
+        tail_x, tail_y = window_x[full:], window_y[full:]
+
+    if tail_x is not None and len(tail_x):
+        yield tail_x, tail_y, slice(0, len(tail_x))
@@ -1,30 +1,108 @@
-import json
+import bisect
+import io
 import re
+import time
+from collections import deque
+
+from csr_graph import CSRAdjacency, CSRGraphBuilder
+from graph_snapshot import load_snapshot, save_snapshot
+from helpers.error_sink import ErrorSink
+from helpers.file_handler import error_file_path
+from helpers.instrumentation import active as active_metrics
+from helpers.json_writer import write_graph_json
+
+READ_CHUNK_SIZE = 1 << 16  # Размер блока чтения файла с рёбрами
+BACKENDS = ('dict', 'csr')  # Словарь списков кортежей или компактные массивы CSR
+SEPARATOR_CHARACTERS = ', \t\r\n'  # Символы, допустимые между кортежами рёбер
+MAX_JUNK_LENGTH = 40  # Сколько символов лишнего текста между кортежами попадает в журнал
+_EDGE_TUPLE = re.compile(r'([^(]*)\(([^)]*)\)')  # Текст перед кортежем и содержимое скобок
+
+
+def iter_edge_tuples(file, chunk_size=READ_CHUNK_SIZE):
+    # Потоковый разбор файла вида "(a, b, n), (a, b, n), ...": файл читается блоками,
+    # наружу отдаются пары (лишний текст перед кортежем, содержимое скобок). В памяти хранится
+    # только текущий блок и недочитанный кортеж на его границе, поэтому размер файла
+    # не ограничен памятью. Между кортежами допустимы только запятые и пробельные символы,
+    # всё остальное отдаётся первым элементом пары (иначе — пустая строка), чтобы попасть
+    # в журнал ошибок; текст после последнего кортежа отдаётся парой (текст, None).
+    tail = ''
+    pending = ''  # Начало лишнего текста, продолжающегося в следующем блоке
+    while True:
+        chunk = file.read(chunk_size)
+        buffer = tail + chunk
+        position = 0
+        while True:
+            match = _EDGE_TUPLE.match(buffer, position)
+            if match is None:
+                break
+            gap = match.group(1)
+            # Обычный разделитель ", " проверяется сравнением, без разбора символов
+            if pending or (gap and gap != ', '):
+                yield _junk_text(pending + gap), match.group(2)
+                pending = ''
+            else:
+                yield '', match.group(2)
+            position = match.end()
+
+        start = buffer.find('(', position)
+        gap = buffer[position:] if start == -1 else buffer[position:start]
+        # Разделители в начале отбрасываются сразу, а хранится не больше MAX_JUNK_LENGTH символов,
+        # поэтому текст в журнале не зависит от того, где прошла граница блока
+        pending = (pending + gap).lstrip(SEPARATOR_CHARACTERS)[:MAX_JUNK_LENGTH]
+        # Незакрытый кортеж продолжается в следующем блоке
+        tail = '' if start == -1 else buffer[start:]
+        if not chunk:
+            break
+
+    # Незакрытый кортеж в конце файла отдаём как есть, чтобы он попал в журнал ошибок
+    if tail:
+        yield _junk_text(pending), tail[1:].strip()
+    elif _junk_text(pending):
+        yield _junk_text(pending), None
+
+
+def _junk_text(gap):
+    # Лишний текст между кортежами без разделителей по краям, не длиннее MAX_JUNK_LENGTH
+    return gap.lstrip(SEPARATOR_CHARACTERS)[:MAX_JUNK_LENGTH].rstrip(SEPARATOR_CHARACTERS)
 
 
 class DirectedGraph:
-    def __init__(self, file_path):
+    def __init__(self, file_path, backend='dict', snapshot=False):
+        if backend not in BACKENDS:
+            raise ValueError(f"Неизвестный способ хранения графа '{backend}'")
         self.file_path = file_path
+        self.backend = backend
+        self._builder = CSRGraphBuilder() if backend == 'csr' else None
         self.graph = {}
-        self.error_file = "error_" + file_path
-        self.first_error_log = True  # Флаг для перезаписи файла при первом вызове
-        self.load_graph()
+        self.reverse_graph = {}  # Обратный индекс: вершина -> входящие дуги (родитель, порядок)
+        self.topological_order = None  # Заполняется в has_cycle для ациклического графа
+        self._topological_index = None  # Позиции вершин в topological_order, нужны при изменениях графа
+        self.cycle = None
+        self.error_file = error_file_path(file_path)
+        self.errors = ErrorSink(self.error_file)
+        self.metrics = active_metrics()
+        # При snapshot=True граф читается из бинарного снимка рядом с файлом, если тот не устарел,
+        # иначе разбирается текстовый файл и снимок записывается заново
+        with self.metrics.stage("graph.load"):
+            if not (snapshot and self.load_from_snapshot()):
+                self.load_graph()
+                if snapshot:
+                    self.write_snapshot()
 
     def log_error(self, message):
-        # Перезаписываем файл при первом вызове, затем добавляем новые записи
-        mode = 'w' if self.first_error_log else 'a'
-        with open(self.error_file, mode, encoding='utf-8') as error_file:
-            error_file.write(message + "\n")
-        self.first_error_log = False  # Меняем режим на добавление после первого вызова
+        self.errors.log(message)
 
     def load_graph(self):
         try:
             with open(self.file_path, 'r', encoding='utf-8') as file:
-                data = file.read().strip()  # Считываем весь файл одной строкой
-                data = data[1:-1]  # Убираем первую и последнюю скобки
-                edges = data.split('), (')  # Разбиваем на отдельные рёбра
-
-                for line_number, edge in enumerate(edges, start=1):
+                # Рёбра читаются потоково, без загрузки всего файла в память
+                parse_started = time.perf_counter()
+                line_number = 0
+                for line_number, (junk, edge) in enumerate(iter_edge_tuples(file), start=1):
+                    if junk:
+                        self.log_error(f"Строка {line_number}: '{junk}' - лишние данные между кортежами")
+                    if edge is None:
+                        continue
                     parts = [part.strip() for part in edge.split(',')]  # Разбиваем каждое ребро на части
                     if len(parts) != 3 or not all(parts):
                         error_message = f"Строка {line_number}: '({edge})'"
@@ -42,78 +120,266 @@ class DirectedGraph:
                     n = int(n) if n.isdigit() else None  # Преобразуем n в число, если возможно
 
                     # Проверяем существование вершин и добавляем в граф
-                    if a not in self.graph:
-                        self.graph[a] = []
-                    if b not in self.graph and n is not None:
-                        self.graph[b] = []
+                    self._add_vertex(a)
 
                     # Добавляем дугу, если n не None
                     if n is not None:
-                        self.graph[a].append((b, n))
+                        self._add_edge(a, b, n)
+                if line_number == 0:
+                    # Пустой файл, как и прежде, разбирается как один пустой кортеж
+                    self.log_error("Строка 1: '()' - не хватает данных")
+                self.metrics.add_time("graph.parse", time.perf_counter() - parse_started)
+                self.metrics.count("graph.edges_parsed", line_number)
 
-                # Сортировка исходящих дуг по порядковому номеру для каждой вершины
-                for node, edges in self.graph.items():
-                    self.graph[node] = sorted(edges, key=lambda x: x[1])
+                with self.metrics.stage("graph.sort_adjacency"):
+                    self._sort_adjacency()
 
         except FileNotFoundError:
             self.log_error(f"Файл {self.file_path} не найден.")
         except Exception as e:
             self.log_error(f"Произошла непредвиденная ошибка: {e}")
 
-    def save_graph_as_json(self, output_file):
-        # Преобразуем граф в словарь для записи в JSON
-        graph_dict = {node: edges for node, edges in self.graph.items()}
+    def load_from_snapshot(self):
+        try:
+            loaded = load_snapshot(self.file_path)
+        except Exception as e:
+            self.log_error(f"Ошибка при чтении снимка графа: {e}")
+            return False
+        if loaded is None:
+            return False
+
+        self.graph, self.reverse_graph = loaded
+        self._builder = None
+        if self.backend == 'dict':
+            # Снимок хранится в CSR, для словарного представления распаковываем списки
+            self.graph = {node: edges for node, edges in self.graph.items()}
+            self.reverse_graph = {node: incoming for node, incoming in self.reverse_graph.items()}
+        return True
 
+    def write_snapshot(self):
+        if not self.graph:
+            return
         try:
-            # Создаем компактный JSON без лишних отступов для вложенных списков
-            compact_json = json.dumps(graph_dict, ensure_ascii=False)
-
-            # Добавляем отступы на верхнем уровне вручную
-            formatted_json = (
-                compact_json
-                .replace('], [', '],\n        [')  # Отступ между элементами верхнего уровня
-                .replace(']], "', ']\n    ],\n    "')  # Перенос строки после завершения списка для ключа
-                .replace('": [', '": [\n        ')  # Начало верхнего уровня с отступом
-                .replace('}}', '\n}')  # Закрывающая скобка JSON
-                .replace('{', '{\n    ')  # Начало JSON с отступом
-            )
-
-            with open(output_file, 'w', encoding='utf-8') as file:
-                file.write(formatted_json)
+            save_snapshot(self.file_path, self.graph, self.reverse_graph)
+        except Exception as e:
+            self.log_error(f"Ошибка при записи снимка графа: {e}")
+
+    def _add_vertex(self, node):
+        if self._builder is not None:
+            self._builder.add_vertex(node)
+        elif node not in self.graph:
+            self.graph[node] = []
+            self.reverse_graph[node] = []
+
+    def _add_edge(self, a, b, n):
+        # Обратный индекс и сортировка строятся один раз после загрузки
+        if self._builder is not None:
+            self._builder.add_edge(a, b, n)
+            return
+        self._add_vertex(a)
+        self._add_vertex(b)
+        self.graph[a].append((b, n))
+
+    def _sort_adjacency(self):
+        if self._builder is not None:
+            # Упаковка в CSR: дуги сортируются по порядковому номеру при построении
+            self.graph, self.reverse_graph = self._builder.build()
+            self._builder = None
+            return
+
+        # Сортировка исходящих дуг по порядковому номеру для каждой вершины
+        for node, edges in self.graph.items():
+            self.graph[node] = sorted(edges, key=lambda x: x[1])
+        self._build_reverse_index()
+
+    def _build_reverse_index(self):
+        # Обратный индекс строится по уже отсортированным исходящим дугам, поэтому при равных
+        # порядковых номерах родители идут в том же порядке, что и при полном переборе рёбер
+        self.reverse_graph = {node: [] for node in self.graph}
+        for parent, edges in self.graph.items():
+            for child, order in edges:
+                self.reverse_graph[child].append((parent, order))
+        for node, incoming in self.reverse_graph.items():
+            incoming.sort(key=lambda x: x[1])
+
+    def get_incoming(self, node):
+        # Входящие дуги вершины (родитель, порядок), отсортированные по порядковому номеру
+        return self.reverse_graph.get(node, [])
+
+    def save_graph_as_json(self, output_file, compact=False):
+        # Вершины и дуги пишутся в файл по мере обхода графа, без построения всей строки JSON.
+        # compact=True — запись без пробелов и переносов строк для машинной обработки
+        try:
+            with open(output_file, 'w', encoding='utf-8') as file, self.metrics.stage("graph.save_json"):
+                write_graph_json(file, self.graph, compact=compact)
 
             print(f"Граф успешно сохранен в {output_file}")
         except Exception as e:
             self.log_error(f"Ошибка при сохранении графа в файл {output_file}: {e}")
 
-    def has_cycle(self):
-        visited = set()
-        rec_stack = set()
+    def topological_sort(self):
+        # Алгоритм Кана без рекурсии: линейное время, возвращает (порядок, цикл).
+        # Для ациклического графа цикл равен None, иначе порядок равен None.
+        if isinstance(self.graph, CSRAdjacency):
+            return self._topological_sort_csr()
 
-        # обход в глубину
-        def dfs(v):
-            visited.add(v)
-            rec_stack.add(v)
+        in_degree = {node: len(self.get_incoming(node)) for node in self.graph}
+        queue = deque(node for node, degree in in_degree.items() if degree == 0)
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for child, _ in self.graph.get(node, []):
+                in_degree[child] -= 1
+                if in_degree[child] == 0:
+                    queue.append(child)
 
-            for neighbor, _ in self.graph.get(v, []):
-                if neighbor not in visited:
-                    if dfs(neighbor):
-                        return True
-                elif neighbor in rec_stack:
-                    print("Цикл обнаружен в графе.")
-                    return True
+        if len(order) == len(self.graph):
+            return order, None
+        return None, self._extract_cycle(in_degree)
 
-            rec_stack.remove(v)
-            return False
+    def _topological_sort_csr(self):
+        # Тот же алгоритм на плотных номерах вершин и непрерывных массивах дуг
+        in_degree = self.reverse_graph.degrees()
+        order = self.graph.kahn(in_degree)
+        labels = self.graph.labels
+        if len(order) == len(labels):
+            return [labels[vertex] for vertex in order], None
+        return None, self._extract_cycle(dict(zip(labels, in_degree)))
+
+    def _extract_cycle(self, in_degree):
+        # У каждой оставшейся после алгоритма Кана вершины есть необработанный родитель,
+        # поэтому движение по таким родителям обязательно приводит к повтору вершины
+        node = next(node for node, degree in in_degree.items() if degree > 0)
+        position = {}
+        path = []
+        while node not in position:
+            position[node] = len(path)
+            path.append(node)
+            node = next(parent for parent, _ in self.get_incoming(node) if in_degree[parent] > 0)
+        cycle = path[position[node]:]
+        cycle.reverse()  # Путь строился по входящим дугам, разворачиваем в направлении дуг
+        return cycle
 
-        # Запуск DFS для каждой компоненты связности
-        for vertex in self.graph:
-            if vertex not in visited:
-                if dfs(vertex):
-                    return True
+    def has_cycle(self, verbose=True):
+        # Результат сохраняется: порядок переиспользуется при построении префиксной записи
+        with self.metrics.stage("graph.topological_sort"):
+            self.topological_order, self.cycle = self.topological_sort()
+        self._topological_index = None
+        self.metrics.count("graph.nodes_sorted", len(self.graph))
+        if self.cycle is not None:
+            if verbose:
+                print("Цикл обнаружен в графе.")
+            return True
 
-        print("Циклы не обнаружены в графе.")
+        if verbose:
+            print("Циклы не обнаружены в графе.")
         return False
 
+    def find_cycle(self):
+        # Список вершин цикла в направлении дуг или None, если граф ациклический
+        self.has_cycle(verbose=False)
+        return self.cycle
+
+    def add_edge(self, a, b, n):
+        # Добавление дуги в уже загруженный граф с инкрементальной проверкой цикла:
+        # поддерживаемый топологический порядок исправляется только на затронутом участке
+        # (алгоритм Пирса-Келли). Дуга, образующая цикл, не добавляется, выбрасывается ValueError.
+        self._ensure_mutable()
+        if a == b:
+            raise ValueError(f"Дуга {a} -> {b} образует цикл")
+        if self.topological_order is not None:
+            self._reorder_for_edge(a, b)
+
+        self._add_vertex(a)
+        self._add_vertex(b)
+        bisect.insort(self.graph[a], (b, n), key=lambda x: x[1])
+        bisect.insort(self.reverse_graph[b], (a, n), key=lambda x: x[1])
+        self.invalidate(b)
+
+    def remove_edge(self, a, b, n=None):
+        # Удаление одной дуги a -> b (с порядковым номером n, если он указан).
+        # Топологический порядок при удалении дуги остаётся корректным.
+        self._ensure_mutable()
+        edges = self.graph.get(a, [])
+        for position, (child, order) in enumerate(edges):
+            if child == b and (n is None or order == n):
+                del edges[position]
+                self.reverse_graph[b].remove((a, order))
+                break
+        else:
+            raise ValueError(f"Дуга {a} -> {b} не найдена")
+
+        if self.cycle is not None:
+            # После удаления дуги цикл мог исчезнуть, порядок пересчитается при следующей проверке
+            self.topological_order = self.cycle = None
+        self.invalidate(b)
+
+    def invalidate(self, node):
+        # Вызывается, когда меняются входящие дуги вершины; переопределяется в наследниках,
+        # которые кэшируют вычисленные по графу значения
+        pass
+
+    def _ensure_mutable(self):
+        if isinstance(self.graph, CSRAdjacency):
+            # CSR-массивы неизменяемы: при первом изменении переходим к словарному представлению
+            self.graph = {node: edges for node, edges in self.graph.items()}
+            self.reverse_graph = {node: incoming for node, incoming in self.reverse_graph.items()}
+            self.backend = 'dict'
+        if self.topological_order is None and self.cycle is None:
+            # Порядок ещё не строился: строим один раз, дальше он поддерживается инкрементально
+            self.has_cycle(verbose=False)
+        if self.topological_order is not None and len(self.topological_order) < len(self.graph):
+            # Вершины, добавленные после построения порядка, ставим в конец
+            known = set(self.topological_order)
+            self.topological_order.extend(node for node in self.graph if node not in known)
+            self._topological_index = None
+        if self.topological_order is not None and self._topological_index is None:
+            self._topological_index = {node: position for position, node in enumerate(self.topological_order)}
+
+    def _reorder_for_edge(self, a, b):
+        index = self._topological_index
+        for node in (a, b):
+            if node not in index:
+                index[node] = len(self.topological_order)
+                self.topological_order.append(node)
+
+        lower, upper = index[b], index[a]
+        if lower > upper:
+            # a уже стоит раньше b, порядок не меняется
+            return
+
+        # Вершины, достижимые из b и стоящие не позже a: если среди них есть a, дуга замыкает цикл
+        forward = self._bounded_search(b, lambda node: self.graph.get(node, []),
+                                       lambda position: position <= upper, target=a)
+        if forward is None:
+            raise ValueError(f"Дуга {a} -> {b} образует цикл")
+        # Вершины, из которых достижима a, стоящие не раньше b
+        backward = self._bounded_search(a, self.get_incoming, lambda position: position >= lower)
+
+        # Предки a занимают первые из освободившихся позиций, потомки b — следующие
+        affected = sorted(backward, key=index.get) + sorted(forward, key=index.get)
+        positions = sorted(index[node] for node in affected)
+        for node, position in zip(affected, positions):
+            index[node] = position
+            self.topological_order[position] = node
+
+    def _bounded_search(self, start, neighbors, in_range, target=None):
+        # Итеративный обход от start только по вершинам, чья позиция удовлетворяет in_range.
+        # Возвращает множество посещённых вершин или None, если встретилась вершина target.
+        index = self._topological_index
+        visited = {start}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for neighbor, _ in neighbors(node):
+                if neighbor == target:
+                    return None
+                if neighbor not in visited and in_range(index[neighbor]):
+                    visited.add(neighbor)
+                    stack.append(neighbor)
+        return visited
+
     def find_sink(self):
         for node, edges in self.graph.items():
             if not edges:
@@ -121,18 +387,8 @@ class DirectedGraph:
         return None
 
     def build_function(self, node):
-        # Инициализация списка для хранения входящих рёбер
-        incoming = []
-        # Перебор всех рёбер графа
-        for parent, edges in self.graph.items():
-            # Перебор рёбер для каждой вершины
-            for child, order in edges:
-                # Если текущее ребро ведёт к искомой вершине
-                if child == node:
-                    # Добавляем исходящую вершину и порядок ребра в список входящих
-                    incoming.append((parent, order))
-        # Сортировка входящих рёбер по порядку
-        incoming.sort(key=lambda x: x[1])
+        # Входящие рёбра берутся из обратного индекса, уже отсортированными по порядку
+        incoming = self.get_incoming(node)
 
         # Если список входящих рёбер пуст, возвращаем текущую вершину
         if not incoming:
@@ -143,16 +399,101 @@ class DirectedGraph:
         # Формирование и возвращение строки вызова текущей вершины как функции от её детей
         return f"{node}({', '.join(children)})"
 
-    def to_prefix_notation(self):
+    def ancestors_in_order(self, sink, expand=None):
+        # Вершины, от которых зависит sink, в топологическом порядке.
+        # Порядок берётся из has_cycle, обход предков выполняется без рекурсии.
+        # expand(node) позволяет не спускаться к входящим вершинам (например, у констант).
+        if self.topological_order is None and self.has_cycle(verbose=False):
+            raise ValueError(f"Граф содержит цикл: {self.cycle}")
+
+        ancestors = {sink}
+        stack = [sink]
+        while stack:
+            node = stack.pop()
+            if expand is not None and not expand(node):
+                continue
+            for parent, _ in self.get_incoming(node):
+                if parent not in ancestors:
+                    ancestors.add(parent)
+                    stack.append(parent)
+        return [node for node in self.topological_order if node in ancestors]
+
+    def build_bottom_up(self, sink, combine, expand=None, share=None):
+        # Итеративное построение результата для sink: combine(node, parent_results) вызывается
+        # для каждой вершины один раз после её родителей. Промежуточный результат
+        # освобождается, как только его использовали все зависящие от него вершины.
+        # share(node, result) вызывается для вершин с входящими дугами, на которые ссылаются
+        # несколько раз; возвращённое значение подставляется во все ссылки вместо результата.
+        with self.metrics.stage("graph.build_bottom_up"):
+            return self._build_bottom_up(sink, combine, expand, share)
+
+    def _build_bottom_up(self, sink, combine, expand, share):
+        order = self.ancestors_in_order(sink, expand)
+        self.metrics.count("graph.nodes_visited", len(order))
+        expanded = {node: expand is None or expand(node) for node in order}
+        uses = {}
+        for node in order:
+            if expanded[node]:
+                for parent, _ in self.get_incoming(node):
+                    uses[parent] = uses.get(parent, 0) + 1
+
+        results = {}
+        for node in order:
+            incoming = self.get_incoming(node) if expanded[node] else []
+            result = combine(node, [results[parent] for parent, _ in incoming])
+            for parent, _ in incoming:
+                uses[parent] -= 1
+                if uses[parent] == 0:
+                    del results[parent]
+            # Все потребители вершины идут позже в топологическом порядке,
+            # поэтому здесь uses[node] ещё равно полному числу ссылок на неё
+            if share is not None and incoming and uses.get(node, 0) > 1:
+                result = share(node, result)
+            results[node] = result
+        return results[sink]
+
+    def binding_writer(self, file):
+        # Общая вершина записывается в файл один раз строкой "v<вершина> = <выражение>",
+        # дальше в выражениях используется только её имя
+        def share(node, expression):
+            name = f"v{node}"
+            file.write(f"{name} = {expression}\n")
+            return name
+
+        return share
+
+    def format_function(self, node, children):
+        # Вершина без входящих рёбер записывается как есть, иначе как функция от детей
+        if not children:
+            return node
+        return f"{node}({', '.join(children)})"
+
+    def to_prefix_notation(self, shared=False):
+        # shared=True — запись с именованными общими подвыражениями (см. write_prefix_notation)
+        if shared:
+            buffer = io.StringIO()
+            self.write_prefix_notation(buffer, shared=True)
+            return buffer.getvalue()
+
         sink = self.find_sink()
         if not sink:
             return "Невозможно построить функцию"
-        return self.build_function(sink)
+        return self.build_bottom_up(sink, self.format_function)
+
+    def write_prefix_notation(self, file, shared=False):
+        # Потоковая запись префиксной формы в открытый файл. При shared=True каждая вершина,
+        # на которую ссылаются несколько раз, выводится один раз отдельной строкой-привязкой
+        # перед первым использованием, а последняя строка содержит выражение для синка.
+        sink = self.find_sink()
+        if not sink:
+            file.write("Невозможно построить функцию")
+            return
+        share = self.binding_writer(file) if shared else None
+        file.write(self.build_bottom_up(sink, self.format_function, share=share))
 
-    def save_prefix_notation_to_file(self, file_path):
+    def save_prefix_notation_to_file(self, file_path, shared=False):
         with open(file_path, 'w') as file:
-            notation = self.to_prefix_notation()
-            file.write(notation)
+            self.write_prefix_notation(file, shared=shared)
             print(f"Результат сохранён в файл: {file_path}")
 
     def display_graph(self):
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+from array import array
+
+from csr_graph import CSRAdjacency, CSRGraphBuilder, ID_TYPE, ORDER_TYPE, OFFSET_TYPE
+
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_MAGIC = b"DGSNAP1\0"
+SNAPSHOT_VERSION = 1
+HEADER_LENGTH = struct.Struct("<I")  # Длина JSON-заголовка после сигнатуры
+ALIGNMENT = 8  # Выравнивание массивов в файле, чтобы их можно было читать через mmap без копирования
+HASH_BLOCK_SIZE = 1 << 20
+
+# Порядок и типы массивов в файле снимка
+SECTIONS = (
+    ("labels", 'B'),
+    ("label_offsets", OFFSET_TYPE),
+    ("forward_offsets", OFFSET_TYPE),
+    ("forward_targets", ID_TYPE),
+    ("forward_orders", ORDER_TYPE),
+    ("reverse_offsets", OFFSET_TYPE),
+    ("reverse_targets", ID_TYPE),
+    ("reverse_orders", ORDER_TYPE),
+)
+
+
+def snapshot_path(source_path):
+    return source_path + SNAPSHOT_SUFFIX
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_info(path):
+    stat = os.stat(path)
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+
+def to_csr(graph, reverse_graph):
+    # Графы в словарном представлении перед записью упаковываются в CSR.
+    # Списки уже отсортированы, поэтому порядок дуг сохраняется.
+    if isinstance(graph, CSRAdjacency):
+        return graph, reverse_graph
+    builder = CSRGraphBuilder()
+    for node in graph:
+        builder.add_vertex(node)
+    for node, edges in graph.items():
+        for child, order in edges:
+            builder.add_edge(node, child, order)
+    return builder.build()
+
+
+def save_snapshot(source_path, graph, reverse_graph):
+    """
+    Записывает бинарный снимок графа рядом с исходным файлом: сигнатура, JSON-заголовок
+    с размером, временем изменения и хешем исходного файла, затем выровненные массивы CSR.
+    Файл пишется во временный и атомарно переименовывается.
+    """
+    forward, reverse = to_csr(graph, reverse_graph)
+
+    encoded = [label.encode('utf-8') for label in forward.labels]
+    label_offsets = array(OFFSET_TYPE, [0])
+    for label in encoded:
+        label_offsets.append(label_offsets[-1] + len(label))
+
+    arrays = {
+        "labels": array('B', b''.join(encoded)),
+        "label_offsets": label_offsets,
+        "forward_offsets": forward.offsets,
+        "forward_targets": forward.targets,
+        "forward_orders": forward.orders,
+        "reverse_offsets": reverse.offsets,
+        "reverse_targets": reverse.targets,
+        "reverse_orders": reverse.orders,
+    }
+
+    # Смещения считаются от начала области данных, которая сама выровнена
+    sections = {}
+    position = 0
+    for name, typecode in SECTIONS:
+        size = len(arrays[name]) * array(typecode).itemsize
+        sections[name] = [position, size, typecode]
+        position += size + (-size) % ALIGNMENT
+
+    header = dict(source_info(source_path))
+    header.update({
+        "version": SNAPSHOT_VERSION,
+        "source_hash": file_hash(source_path),
+        "vertices": len(forward.labels),
+        "edges": forward.edge_count(),
+        "sections": sections,
+    })
+    header_bytes = json.dumps(header).encode('utf-8')
+    prefix_size = len(SNAPSHOT_MAGIC) + HEADER_LENGTH.size + len(header_bytes)
+    padding = (-prefix_size) % ALIGNMENT
+
+    path = snapshot_path(source_path)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'wb') as file:
+        file.write(SNAPSHOT_MAGIC)
+        file.write(HEADER_LENGTH.pack(len(header_bytes)))
+        file.write(header_bytes)
+        file.write(b'\0' * padding)
+        for name, _ in SECTIONS:
+            data = arrays[name]
+            # Массив пишется напрямую из буфера, без промежуточной копии в bytes
+            file.write(memoryview(data).cast('B'))
+            size = sections[name][1]
+            file.write(b'\0' * ((-size) % ALIGNMENT))
+    os.replace(temporary_path, path)
+    return path
+
+
+def read_header(file):
+    if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        return None, 0
+    (length,) = HEADER_LENGTH.unpack(file.read(HEADER_LENGTH.size))
+    header = json.loads(file.read(length).decode('utf-8'))
+    prefix_size = len(SNAPSHOT_MAGIC) + HEADER_LENGTH.size + length
+    return header, prefix_size + (-prefix_size) % ALIGNMENT
+
+
+def is_fresh(header, source_path, info=None):
+    # Совпадение размера и времени изменения считается достаточным. Если изменилось только
+    # время (файл перезаписан тем же содержимым), решение принимается по хешу.
+    if header.get("version") != SNAPSHOT_VERSION:
+        return False
+    info = info or source_info(source_path)
+    if info["source_size"] != header["source_size"]:
+        return False
+    if info["source_mtime_ns"] == header["source_mtime_ns"]:
+        return True
+    return file_hash(source_path) == header["source_hash"]
+
+
+def refresh_header(path, header, data_start):
+    # Снимок с новым заголовком: массивы копируются как есть (смещения отсчитываются от начала
+    # области данных), файл подменяется атомарно, уже открытые отображения старого файла не страдают
+    header_bytes = json.dumps(header).encode('utf-8')
+    prefix_size = len(SNAPSHOT_MAGIC) + HEADER_LENGTH.size + len(header_bytes)
+    temporary_path = path + ".tmp"
+    with open(path, 'rb') as source, open(temporary_path, 'wb') as file:
+        file.write(SNAPSHOT_MAGIC)
+        file.write(HEADER_LENGTH.pack(len(header_bytes)))
+        file.write(header_bytes)
+        file.write(b'\0' * ((-prefix_size) % ALIGNMENT))
+        source.seek(data_start)
+        shutil.copyfileobj(source, file, HASH_BLOCK_SIZE)
+    os.replace(temporary_path, path)
+
+
+def load_snapshot(source_path):
+    """
+    Отображает снимок в память и возвращает (прямой, обратный) индексы CSR поверх mmap,
+    или None, если снимка нет либо он устарел относительно исходного файла.
+    """
+    path = snapshot_path(source_path)
+    if not (os.path.exists(path) and os.path.exists(source_path)):
+        return None
+
+    info = source_info(source_path)
+    with open(path, 'rb') as file:
+        header, data_start = read_header(file)
+        if header is None or not is_fresh(header, source_path, info):
+            return None
+        # Отображение остаётся доступным после закрытия файла
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if info["source_mtime_ns"] != header["source_mtime_ns"]:
+        # Содержимое совпало по хешу, но время изменения другое (touch, checkout): запоминаем
+        # новое время, чтобы следующие загрузки не хешировали исходный файл заново
+        header.update(info)
+        try:
+            refresh_header(path, header, data_start)
+        except OSError:
+            # Снимок только для чтения — он остаётся верным, просто проверка будет по хешу
+            pass
+
+    view = memoryview(mapped)
+    sections = {}
+    for name, (offset, size, typecode) in header["sections"].items():
+        start = data_start + offset
+        sections[name] = view[start:start + size].cast(typecode)
+
+    # Метки нужны в виде строк для словаря метка -> номер, остальное читается из mmap напрямую
+    blob = sections["labels"]
+    label_offsets = sections["label_offsets"]
+    labels = [str(blob[label_offsets[i]:label_offsets[i + 1]], 'utf-8') for i in range(header["vertices"])]
+    index = {label: vertex for vertex, label in enumerate(labels)}
+
+    forward = CSRAdjacency(labels, index, sections["forward_offsets"],
+                           sections["forward_targets"], sections["forward_orders"])
+    reverse = CSRAdjacency(labels, index, sections["reverse_offsets"],
+                           sections["reverse_targets"], sections["reverse_orders"])
+    return forward, reverse
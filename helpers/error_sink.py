@@ -0,0 +1,126 @@
+import atexit
+import json
+import re
+import weakref
+
+from helpers.file_handler import parse_option
+
+MAX_LINES = 1000  # Сколько сообщений записывается дословно, остальные только подсчитываются
+FLUSH_THRESHOLD = 256  # Размер буфера (сообщений), после которого он сбрасывается в файл
+
+_QUOTED = re.compile(r"'[^']*'")
+_NUMBER = re.compile(r"\d+")
+
+# Открытые журналы сбрасываются при завершении интерпретатора. Слабые ссылки не мешают
+# сборке журналов, поэтому тысячи объектов (пакетная обработка) не накапливаются в памяти.
+_open_sinks = weakref.WeakSet()
+
+# Настройки для новых журналов; задаются один раз из командной строки (configure_from_args)
+defaults = {"max_lines": MAX_LINES, "flush_threshold": FLUSH_THRESHOLD, "json_lines": False}
+
+
+def configure_from_args():
+    """
+    Читает из командной строки настройки журналов ошибок, создаваемых после вызова:
+    errors_max_lines=N — сколько сообщений записывать дословно (по умолчанию MAX_LINES),
+    errors_format=jsonl — писать записи и сводку в формате JSON Lines. Задачи вызывают
+    эту функцию в начале main(), до создания графов и сетей.
+    """
+    defaults["max_lines"] = int(parse_option("errors_max_lines", str(MAX_LINES)))
+    defaults["json_lines"] = parse_option("errors_format", "text") == "jsonl"
+
+
+def error_kind(message):
+    # Вид ошибки — сообщение без конкретных данных: содержимое кавычек и числа заменяются
+    # заполнителями, так что «Строка 3: '(1, 2)' - не хватает данных» и «Строка 7: '(4, 1)' - ...»
+    # относятся к одному виду
+    return _NUMBER.sub("N", _QUOTED.sub("'…'", message))
+
+
+class ErrorSink:
+    """
+    Журнал ошибок с буферизацией. Сообщения накапливаются в памяти и записываются в файл
+    пачками — при заполнении буфера, при close() и при завершении программы, — поэтому
+    файл открывается один раз на пачку, а не на каждое сообщение. Файл создаётся только
+    при первой ошибке и перезаписывается, как и прежде.
+
+    Сообщения считаются по видам (см. error_kind). Дословно записываются первые max_lines
+    сообщений; если какие-то были пропущены, при закрытии в конец журнала дописывается
+    сводка по видам с числом сообщений. В режиме json_lines каждая запись — объект JSON
+    в отдельной строке, а сводка пишется всегда.
+    """
+
+    def __init__(self, path, max_lines=None, flush_threshold=None, json_lines=None):
+        self.path = path
+        self.max_lines = defaults["max_lines"] if max_lines is None else max_lines
+        self.flush_threshold = defaults["flush_threshold"] if flush_threshold is None else flush_threshold
+        self.json_lines = defaults["json_lines"] if json_lines is None else json_lines
+        self.buffer = []
+        self.counts = {}  # Вид ошибки -> число сообщений
+        self.total = 0
+        self.written = 0  # Сколько сообщений попало в журнал дословно
+        self.started = False  # Файл уже создан в этом запуске, дальше только дописываем
+        self.closed = False
+        _open_sinks.add(self)
+
+    def log(self, message, kind=None):
+        if self.closed:
+            # После закрытия журнал открывается снова, новые сообщения дописываются в конец файла
+            self.closed = False
+            _open_sinks.add(self)
+        kind = kind or error_kind(message)
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        self.total += 1
+        if self.written < self.max_lines:
+            self.written += 1
+            if self.json_lines:
+                self.buffer.append(json.dumps({"kind": kind, "message": message}, ensure_ascii=False))
+            else:
+                self.buffer.append(message)
+            if len(self.buffer) >= self.flush_threshold:
+                self.flush()
+
+    @property
+    def suppressed(self):
+        return self.total - self.written
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self._write(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        if self.closed:
+            return
+        lines = self.buffer
+        self.buffer = []
+        if self.json_lines and self.total:
+            lines.append(json.dumps({"summary": self.counts, "total": self.total,
+                                     "suppressed": self.suppressed}, ensure_ascii=False))
+        elif self.suppressed:
+            lines.append(f"... пропущено сообщений: {self.suppressed} (всего {self.total}), по видам:")
+            lines.extend(f"{count} × {kind}" for kind, count in self.counts.items())
+        if lines:
+            self._write(lines)
+        # Следующий запуск журнала начнёт сводку заново
+        self.counts, self.total, self.written = {}, 0, 0
+        self.closed = True
+        _open_sinks.discard(self)
+
+    def _write(self, lines):
+        with open(self.path, 'a' if self.started else 'w', encoding='utf-8') as file:
+            file.write("\n".join(lines) + "\n")
+        self.started = True
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+@atexit.register
+def _close_open_sinks():
+    for sink in list(_open_sinks):
+        sink.close()
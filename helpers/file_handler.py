@@ -1,3 +1,4 @@
+import os
 import sys
 import re
 
@@ -30,3 +31,18 @@ def parse_args():
             output2 = arg.split("=", 1)[1].strip()
 
     return input1, input2, input3, output1, output2
+
+
+def error_file_path(path):
+    # Журнал ошибок лежит рядом с входным файлом: error_<имя файла> в том же каталоге
+    directory, name = os.path.split(path)
+    return os.path.join(directory, "error_" + name)
+
+
+def parse_option(name, default=None):
+    # Дополнительный параметр вида name=value (например, backend=csr)
+    for arg in sys.argv[1:]:
+        arg = arg.strip()  # Удаляем лишние пробелы и табуляции
+        if arg.startswith(name + "="):
+            return arg.split("=", 1)[1].strip()
+    return default
@@ -0,0 +1,140 @@
+import contextlib
+import json
+import time
+
+from helpers.file_handler import parse_option
+
+
+class Metrics:
+    """
+    Сбор показателей выполнения: суммарное время и число вызовов этапов, счётчики
+    и ряды значений (например, примеров в секунду на каждой итерации обучения).
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.timers = {}  # Этап -> [суммарное время, число вызовов]
+        self.counters = {}
+        self.series = {}
+        self.started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [seconds, 1]
+        else:
+            timer[0] += seconds
+            timer[1] += 1
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name, value):
+        self.series.setdefault(name, []).append(value)
+
+    def to_dict(self):
+        return {
+            "wall_seconds": time.perf_counter() - self.started,
+            "stages": {name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in self.timers.items()},
+            "counters": self.counters,
+            "series": self.series,
+        }
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, indent=4)
+
+
+class NullMetrics:
+    """
+    Заглушка с тем же интерфейсом, что и Metrics, используется по умолчанию. Ничего не записывает;
+    stage возвращает один и тот же пустой контекстный менеджер, поэтому выключенная
+    инструментация стоит один вызов метода на этап.
+    """
+
+    enabled = False
+    _null_stage = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._null_stage
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def record(self, name, value):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+_active = NULL_METRICS
+
+
+def active():
+    # Текущий сборщик показателей (время этапов и счётчики); по умолчанию — пустая заглушка
+    # NullMetrics. Объекты запоминают его при создании
+    return _active
+
+
+def enable():
+    global _active
+    _active = Metrics()
+    return _active
+
+
+def disable():
+    global _active
+    _active = NULL_METRICS
+
+
+def run_with_instrumentation(main):
+    """
+    Запуск main() задачи с необязательными параметрами командной строки:
+    metrics=metrics.json — собрать показатели этапов и сохранить их в JSON;
+    profile=run.prof — выполнить под cProfile и сохранить статистику (pstats);
+    tracemalloc=1 — измерить пиковую память (попадает в показатели или выводится на экран).
+    Без этих параметров main() вызывается как обычно.
+    """
+    metrics_file = parse_option("metrics")
+    profile_file = parse_option("profile")
+    trace_memory = parse_option("tracemalloc", "0") == "1"
+    metrics = enable() if metrics_file or trace_memory else None
+
+    profiler = None
+    if profile_file:
+        import cProfile
+        profiler = cProfile.Profile()
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    try:
+        if profiler:
+            profiler.runcall(main)
+        else:
+            main()
+    finally:
+        if trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            metrics.counters["tracemalloc.peak_bytes"] = peak
+            metrics.counters["tracemalloc.current_bytes"] = current
+            if not metrics_file:
+                print(f"Пиковая память (tracemalloc): {peak / 2 ** 20:.1f} МБ")
+        if profiler:
+            profiler.dump_stats(profile_file)
+            print(f"Профиль сохранён в {profile_file}")
+        if metrics_file:
+            metrics.save(metrics_file)
+            print(f"Показатели сохранены в {metrics_file}")
+        disable()
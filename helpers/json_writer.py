@@ -0,0 +1,42 @@
+import json
+
+
+def write_graph_json(file, graph, compact=False):
+    # Потоковая запись графа {вершина: [(сосед, порядок), ...]} в JSON.
+    # Каждая вершина и дуга кодируется отдельно и сразу пишется в файл, поэтому расход памяти
+    # не зависит от размера графа, а метки со спецсимволами экранируются штатно через json.
+    if compact:
+        separator, item_start, item_end, edge_start, edge_separator, edges_end = ',', '', '', '', ',', ']'
+        edge_format = '[{},{}]'
+    else:
+        separator, item_start, item_end = ',', '\n    ', '\n'
+        edge_start, edge_separator, edges_end = '\n        ', ',\n        ', '\n    ]'
+        edge_format = '[{}, {}]'
+
+    file.write('{')
+    first_node = True
+    for node, edges in graph.items():
+        if not first_node:
+            file.write(separator)
+        first_node = False
+        file.write(item_start)
+        file.write(json.dumps(node, ensure_ascii=False))
+        file.write(':[' if compact else ': [')
+
+        if not edges:
+            # Пустой список дуг записываем в одну строку
+            file.write(']')
+            continue
+
+        file.write(edge_start)
+        first_edge = True
+        for child, order in edges:
+            if not first_edge:
+                file.write(edge_separator)
+            first_edge = False
+            file.write(edge_format.format(json.dumps(child, ensure_ascii=False), json.dumps(order)))
+        file.write(edges_end)
+
+    if not first_node:
+        file.write(item_end)
+    file.write('}')
@@ -0,0 +1,118 @@
+# Коды инструкций ленты
+CONST, ADD, MUL, EXP = 0, 1, 2, 3
+OPCODES = {'+': ADD, '*': MUL, 'exp': EXP}
+
+
+class OperationTape:
+    """
+    Граф операций, скомпилированный в плоскую ленту инструкций в топологическом порядке.
+
+    Каждой вершине соответствует слот. Константные вершины читают свой слот из столбца матрицы
+    констант, остальные вершины вычисляются одной операцией NumPy над всем пакетом сразу.
+    Слот освобождается после последнего использования, поэтому одновременно в памяти
+    хранятся только «живые» промежуточные массивы.
+    """
+
+    def __init__(self, nodes, constants, defaults, instructions, sink_slot):
+        self.nodes = nodes  # Вершины в порядке слотов
+        self.constants = constants  # Константные вершины в порядке столбцов матрицы констант
+        self.defaults = defaults  # Значения констант из файла операций, по которому компилировали
+        self.instructions = instructions  # (код, слот результата, слоты аргументов, освобождаемые слоты)
+        self.sink_slot = sink_slot
+
+    @classmethod
+    def compile(cls, graph, sink):
+        """
+        Компиляция графа операций: обход предков синка в топологическом порядке,
+        назначение слотов и разбор строковых операций в коды один раз.
+
+        :param graph: DirectedGraphWithOperations
+        :param sink: конечная вершина графа
+        :return: OperationTape
+        """
+        nodes = graph.ancestors_in_order(sink, expand=graph.is_expandable)
+        slots = {node: slot for slot, node in enumerate(nodes)}
+
+        constants, defaults, instructions = [], [], []
+        last_use = {}
+        for node in nodes:
+            operation = graph.operations.get(node)
+            if operation is None:
+                raise ValueError(f"Операция для вершины {node} не найдена")
+
+            if isinstance(operation, (int, float)):
+                instructions.append([CONST, slots[node], (len(constants),), ()])
+                constants.append(node)
+                defaults.append(float(operation))
+                continue
+
+            opcode = OPCODES.get(operation)
+            if opcode is None:
+                graph.log_error(f"Неизвестная операция '{operation}' для вершины {node}")
+                raise ValueError(f"Неизвестная операция '{operation}' для вершины {node}")
+            arguments = tuple(slots[parent] for parent, _ in graph.get_incoming(node))
+            if opcode == EXP and len(arguments) != 1:
+                graph.log_error("Операция 'exp' должна иметь ровно один аргумент")
+                raise ValueError("Операция 'exp' должна иметь ровно один аргумент")
+            for argument in arguments:
+                last_use[argument] = len(instructions)
+            instructions.append([opcode, slots[node], arguments, ()])
+
+        # После инструкции освобождаются слоты, которые ей были нужны в последний раз
+        releases = {}
+        for slot, position in last_use.items():
+            releases.setdefault(position, []).append(slot)
+        for position, released in releases.items():
+            instructions[position][3] = tuple(released)
+
+        return cls(nodes, constants, defaults, [tuple(instruction) for instruction in instructions], slots[sink])
+
+    def constants_vector(self, operations):
+        # Вектор констант для ленты из словаря операций; отсутствующие берутся из исходного файла
+        vector = []
+        for node, default in zip(self.constants, self.defaults):
+            value = operations.get(node, default)
+            vector.append(float(value) if isinstance(value, (int, float)) else default)
+        return vector
+
+    def evaluate_batch(self, constant_vectors=None):
+        """
+        Вычисление функции для пакета наборов констант.
+
+        :param constant_vectors: матрица формы (B, число констант) или один вектор;
+                                 по умолчанию — константы из файла операций
+        :return: массив NumPy из B значений функции в синке
+        """
+        import numpy as np  # Нужен только для пакетного режима
+
+        if constant_vectors is None:
+            constant_vectors = [self.defaults]
+        batch = np.asarray(constant_vectors, dtype=np.float64)
+        if batch.ndim == 1:
+            batch = batch.reshape(1, -1)
+        if batch.shape[1] != len(self.constants):
+            raise ValueError(
+                f"Ожидалось {len(self.constants)} констант в наборе, получено {batch.shape[1]}"
+            )
+
+        size = batch.shape[0]
+        slots = [None] * len(self.nodes)
+        for opcode, target, arguments, released in self.instructions:
+            if opcode == CONST:
+                slots[target] = batch[:, arguments[0]]
+            elif opcode == ADD:
+                # Накопление на месте в том же порядке, что и в поэлементном вычислении (0 + a + b + ...)
+                result = np.zeros(size)
+                for slot in arguments:
+                    result += slots[slot]
+                slots[target] = result
+            elif opcode == MUL:
+                result = np.ones(size)
+                for slot in arguments:
+                    result *= slots[slot]
+                slots[target] = result
+            else:
+                slots[target] = np.exp(slots[arguments[0]])
+            for slot in released:
+                slots[slot] = None
+        return slots[self.sink_slot]
@@ -0,0 +1,168 @@
+import contextlib
+import glob
+import importlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from helpers.file_handler import error_file_path, parse_args, parse_option
+
+TASKS = {str(number): f"nntask{number}" for number in range(1, 6)}
+
+
+def load_manifest(path):
+    # Манифест: по заданию в строке, аргументы в том же виде, что и в командной строке задачи
+    # (input1=graph1.txt output1=graph1.json); пустые строки и строки с # пропускаются
+    jobs = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                jobs.append(line.split())
+    return jobs
+
+
+def expand_glob(pattern, template):
+    # Для каждого найденного файла — input1=файл и аргументы из шаблона, где {stem} — имя файла
+    # без расширения, {name} — имя файла, {dir} — каталог (output1=out/{stem}.json).
+    # Журналы ошибок, оставленные предыдущими запусками, заданиями не считаются.
+    jobs = []
+    for path in sorted(glob.glob(pattern)):
+        directory, name = os.path.split(path)
+        if name.startswith("error_"):
+            continue
+        fields = {"stem": os.path.splitext(name)[0], "name": name, "dir": directory or "."}
+        jobs.append([f"input1={path}"] + [argument.format(**fields) for argument in template.split()])
+    return jobs
+
+
+def error_file_of(arguments):
+    # Все задачи пишут журнал ошибок рядом с input1 (для nntask1 по умолчанию input41.txt)
+    input1 = next((argument.split("=", 1)[1] for argument in arguments if argument.startswith("input1=")),
+                  "input41.txt")
+    return error_file_path(input1)
+
+
+def output_file_of(arguments):
+    # Основной результат задачи — output1 (по умолчанию output.json, см. parse_args)
+    return next((argument.split("=", 1)[1] for argument in arguments if argument.startswith("output1=")),
+                "output.json")
+
+
+def written_since(path, started_wall):
+    return os.path.exists(path) and os.path.getmtime(path) >= started_wall
+
+
+def init_worker(task):
+    # Модуль задачи импортируется один раз на процесс; numpy подгружается только задачами 4 и 5
+    importlib.import_module(TASKS[task])
+
+
+def run_job(task, number, arguments):
+    """
+    Выполнение одного задания: main() задачи вызывается с подменённым sys.argv,
+    вывод задачи перехватывается.
+
+    Статусы: ok; errors_logged — задача записала журнал ошибок; no_output — задача
+    завершилась без исключения, но не записала output1 (например, граф с циклом);
+    failed — задача завершилась исключением.
+
+    :return: запись для сводки — статус, время выполнения, журнал ошибок задачи
+    """
+    module = importlib.import_module(TASKS[task])
+    error_file = error_file_of(arguments)
+    output_file = output_file_of(arguments)
+    saved_argv = sys.argv
+    sys.argv = [module.__file__] + arguments
+    started_wall = time.time()
+    started = time.perf_counter()
+    record = {"job": number, "arguments": arguments, "status": "ok"}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            module.main()
+    except BaseException as e:  # Задача могла вызвать sys.exit, это тоже ошибка задания
+        record["status"] = "failed"
+        record["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        sys.argv = saved_argv
+    record["seconds"] = time.perf_counter() - started
+
+    # Журнал, записанный во время этого задания, означает, что задача сообщила об ошибках во входных данных
+    if written_since(error_file, started_wall):
+        record["error_file"] = error_file
+        if record["status"] == "ok":
+            record["status"] = "errors_logged"
+    # Без результата задание не считается выполненным, даже если ошибок в журнале нет
+    if record["status"] != "failed" and not written_since(output_file, started_wall):
+        record["status"] = "no_output"
+        record["output_file"] = output_file
+    return record
+
+
+def run_batch(task, jobs, workers=1):
+    # Задания выполняются в пуле процессов, сводка — в порядке заданий
+    if workers <= 1:
+        init_worker(task)
+        return [run_job(task, number, arguments) for number, arguments in enumerate(jobs, start=1)]
+
+    # Крупные порции заданий уменьшают накладные расходы на передачу между процессами
+    chunk_size = max(1, len(jobs) // (workers * 16))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(task,)) as executor:
+        return list(executor.map(run_job, [task] * len(jobs), range(1, len(jobs) + 1), jobs, chunksize=chunk_size))
+
+
+def save_summary(output_file, task, records, seconds):
+    counts = {}
+    for record in records:
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+    summary = {
+        "task": TASKS[task],
+        "jobs": len(records),
+        "statuses": counts,
+        "seconds": seconds,
+        "job_seconds": sum(record["seconds"] for record in records),
+        "results": records,
+    }
+    with open(output_file, 'w', encoding='utf-8') as file:
+        json.dump(summary, file, ensure_ascii=False, indent=4)
+    return counts
+
+
+# python batch_runner.py task=1 input1=manifest.txt output1=summary.json workers=8
+# python batch_runner.py task=2 glob=graphs/*.txt args="output1=out/{stem}.txt backend=csr" workers=8
+def main():
+    # task - номер задачи (1-5)
+    # input1 - Манифест заданий: по строке аргументов задачи на задание
+    # glob - Вместо манифеста: шаблон входных файлов, args - аргументы задачи для каждого файла
+    # output1 - Сводка по заданиям (статус и время каждого), JSON
+    input1, input2, input3, output1, output2 = parse_args()
+    task = parse_option("task", "1")
+    if task not in TASKS:
+        print(f"Ошибка: неизвестная задача {task}, допустимы {', '.join(TASKS)}")
+        return
+    pattern = parse_option("glob")
+    workers = int(parse_option("workers", str(os.cpu_count() or 1)))
+
+    if pattern:
+        jobs = expand_glob(pattern, parse_option("args", ""))
+    else:
+        try:
+            jobs = load_manifest(input1)
+        except FileNotFoundError:
+            print(f"Ошибка: файл {input1} не найден.")
+            return
+    print(f"Задача: {TASKS[task]}, заданий: {len(jobs)}, процессов: {workers}")
+
+    started = time.perf_counter()
+    records = run_batch(task, jobs, workers)
+    seconds = time.perf_counter() - started
+
+    counts = save_summary(output1, task, records, seconds)
+    print(f"Выполнено за {seconds:.3f} с: " + ", ".join(f"{status} — {count}" for status, count in sorted(counts.items())))
+    print(f"Сводка сохранена в {output1}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import numpy as np
+from helpers.file_handler import parse_args, parse_option
+from weights_format import (is_binary_weights, load_binary_weights, network_structure, read_text_weights,
+                            save_binary_weights, write_structure_json, write_text_weights)
+
+
+# python convert_weights.py input1=input41.txt output1=weights.nnw dtype=float32
+# python convert_weights.py input1=weights.nnw output1=input41.txt
+# python convert_weights.py input1=weights.nnw output1=network.json
+def main():
+    # input1 - Файл весов (текстовый или двоичный)
+    # output1 - Результат: .json — структура сети, как в nntask4; иначе из текстового формата
+    #           получается двоичный, из двоичного — текстовый
+    input1, input2, input3, output1, output2 = parse_args()
+    print(f"Входной файл: {input1}")
+    print(f"Выходной файл: {output1}")
+
+    errors = []
+    try:
+        if is_binary_weights(input1):
+            layers = load_binary_weights(input1)
+            numbers = list(range(1, len(layers) + 1))
+        else:
+            layers, numbers = read_text_weights(input1, np.dtype(parse_option("dtype", "float64")), errors.append)
+    except FileNotFoundError:
+        print(f"Ошибка: файл {input1} не найден.")
+        return
+    for message in errors:
+        print(message)
+
+    if output1.endswith(".json"):
+        write_structure_json(output1, network_structure(input1, layers, numbers))
+    elif is_binary_weights(input1):
+        write_text_weights(output1, layers)
+    else:
+        save_binary_weights(output1, layers)
+    print(f"Веса успешно сохранены в {output1}")
+
+
+if __name__ == '__main__':
+    main()
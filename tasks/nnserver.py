@@ -0,0 +1,211 @@
+import json
+import os
+import queue
+import signal
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+from helpers.file_handler import parse_args, parse_option
+from nntask4 import NeuralNetwork
+
+LATENCY_WINDOW = 10000  # Число последних запросов, по которым считаются перцентили задержки
+
+
+class InferenceServer:
+    """
+    Сервер прямого прохода для сети nntask4: веса загружаются один раз, запросы принимаются
+    построчно (через stdin/stdout или Unix-сокет). Запросы, пришедшие в пределах окна
+    window секунд, объединяются в один пакет и вычисляются одним умножением матриц на слой.
+
+    Протокол: строка с числами через пробел — входной вектор, ответ — JSON-список выходов;
+    строка "stats" — JSON со счётчиками, в которые уже вошли все векторы, отправленные до неё;
+    при ошибке ответ начинается с "error:".
+    """
+
+    def __init__(self, network, window=0.002, max_batch=256):
+        self.network = network
+        self.window = window  # Окно накопления пакета, секунды
+        self.max_batch = max_batch  # Пакет отправляется сразу, как только набрано столько запросов
+        self.size = network.layers[0].shape[1]
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.compute_time = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.worker = threading.Thread(target=self.batch_loop, daemon=True)
+        self.worker.start()
+
+    def submit_line(self, line):
+        # Возвращает Future со строкой ответа; порядок ответов задаёт вызывающий
+        future = Future()
+        line = line.strip()
+        if line == "stats":
+            # Запрос идёт через общую очередь, чтобы ответить после уже накопленного пакета
+            self.pending.put((None, future, time.perf_counter()))
+            return future
+        try:
+            vector = [float(x) for x in line.split()]
+            if len(vector) != self.size:
+                raise ValueError(f"ожидалось {self.size} чисел, получено {len(vector)}")
+        except ValueError as e:
+            with self.lock:
+                self.errors += 1
+            future.set_result(f"error: некорректный входной вектор: {e}")
+            return future
+        self.pending.put((vector, future, time.perf_counter()))
+        return future
+
+    def batch_loop(self):
+        while True:
+            # Первый запрос ждём без ограничения, остальные — не дольше окна от его прихода
+            request = self.pending.get()
+            if request[0] is None:
+                self.answer_stats(request)
+                continue
+            batch = [request]
+            stats_request = None
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request[0] is None:
+                    # stats закрывает пакет досрочно: счётчики должны учитывать его векторы
+                    stats_request = request
+                    break
+                batch.append(request)
+            self.run_batch(batch)
+            if stats_request is not None:
+                self.answer_stats(stats_request)
+
+    def answer_stats(self, request):
+        _, future, _ = request
+        future.set_result(json.dumps(self.stats(), ensure_ascii=False))
+
+    def run_batch(self, batch):
+        start = time.perf_counter()
+        try:
+            outputs = self.network.propagate(np.array([vector for vector, _, _ in batch], dtype=np.float64))
+            responses = [json.dumps(row) for row in outputs.tolist()]
+        except Exception as e:
+            responses = [f"error: {e}"] * len(batch)
+        finished = time.perf_counter()
+
+        with self.lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.compute_time += finished - start
+            self.latencies.extend(finished - submitted for _, _, submitted in batch)
+        for (_, future, _), response in zip(batch, responses):
+            future.set_result(response)
+
+    def stats(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started
+            latencies = sorted(self.latencies)
+
+            def percentile(fraction):
+                return latencies[min(int(fraction * len(latencies)), len(latencies) - 1)] * 1000 if latencies else 0.0
+
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "errors": self.errors,
+                "average_batch": self.requests / self.batches if self.batches else 0.0,
+                "throughput_per_second": self.requests / elapsed if elapsed else 0.0,
+                "compute_seconds": self.compute_time,
+                "latency_ms": {
+                    "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+                    "p50": percentile(0.5),
+                    "p99": percentile(0.99),
+                    "max": latencies[-1] * 1000 if latencies else 0.0,
+                },
+                "uptime_seconds": elapsed,
+            }
+
+    def serve_stdio(self, source=sys.stdin, target=sys.stdout):
+        # Строки читаются без ожидания ответов, поэтому запросы одного потока тоже объединяются
+        # в пакеты; ответы пишутся отдельным потоком в порядке запросов
+        responses = queue.Queue()
+
+        def write_responses():
+            while True:
+                future = responses.get()
+                if future is None:
+                    break
+                target.write(future.result() + "\n")
+                if responses.empty():
+                    target.flush()
+            target.flush()
+
+        writer = threading.Thread(target=write_responses)
+        writer.start()
+        for line in source:
+            if line.strip():
+                responses.put(self.submit_line(line))
+        responses.put(None)
+        writer.join()
+
+    def serve_unix(self, path):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                # Каждое соединение обслуживается своим потоком; запросы разных соединений
+                # попадают в общую очередь и объединяются в пакеты
+                for line in self.rfile:
+                    line = line.decode('utf-8')
+                    if not line.strip():
+                        continue
+                    self.wfile.write((server.submit_line(line).result() + "\n").encode('utf-8'))
+
+        if os.path.exists(path):
+            os.remove(path)
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as unix_server:
+            unix_server.daemon_threads = True
+            try:
+                unix_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(path)
+
+
+# python nnserver.py input1=input41.txt
+# python nnserver.py input1=input41.txt socket=/tmp/nn.sock window_ms=2 max_batch=256
+def main():
+    # input1 - Входной файл с матрицами весов (текстовый или двоичный)
+    # Без параметра socket запросы читаются из stdin, ответы пишутся в stdout
+    input1, input2, input3, output1, output2 = parse_args()
+    network = NeuralNetwork(input1)
+    if not network.layers or not network.validate_shapes(network.layers[0].shape[1]):
+        network.errors.flush()
+        print(f"Ошибка: не удалось загрузить сеть из {input1}, подробности в {network.error_file}", file=sys.stderr)
+        return
+
+    server = InferenceServer(network, window=float(parse_option("window_ms", "2")) / 1000,
+                             max_batch=int(parse_option("max_batch", "256")))
+    socket_path = parse_option("socket")
+    if socket_path:
+        print(f"Сервер запущен: {socket_path}", file=sys.stderr)
+        # По SIGTERM сервер завершается так же, как по Ctrl+C, и удаляет файл сокета
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        server.serve_unix(socket_path)
+    else:
+        server.serve_stdio()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,28 @@
-from helpers.file_handler import parse_args
+from helpers.error_sink import configure_from_args
+from helpers.file_handler import parse_args, parse_option
+from helpers.instrumentation import run_with_instrumentation
 from graph import DirectedGraph
 
-# python nntask1.py input1=input41.txt output1=output1.json
+# python nntask1.py input1=input41.txt output1=output1.json backend=csr
 # python nntask2.py input1=input41.txt output1=output1.json input2=input42.txt output2=output2.json
 def main():
     input1, input2, input3, output1, output2 = parse_args()
+    configure_from_args()
+    backend = parse_option("backend", "dict")  # dict или csr
+    snapshot = parse_option("snapshot", "0") == "1"  # Кэшировать разобранный граф в бинарном снимке
     print(f"Входные файлы: {input1}, {input2}")
     print(f"Выходные файлы: {output1}, {output2}")
 
-    graph = DirectedGraph(input1 if input1 else "input41.txt")
+    graph = DirectedGraph(input1 if input1 else "input41.txt", backend=backend, snapshot=snapshot)
     graph.save_graph_as_json(output1 if output1 else "output.json")
     graph.display_graph()
 
     if input2 and output2:
         print("------Второй граф------")
-        graph = DirectedGraph(input2)
+        graph = DirectedGraph(input2, backend=backend, snapshot=snapshot)
         graph.save_graph_as_json(output2)
         graph.display_graph()
 
 
 if __name__ == '__main__':
-    main()
+    run_with_instrumentation(main)
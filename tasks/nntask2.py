@@ -1,4 +1,6 @@
-from helpers.file_handler import parse_args
+from helpers.error_sink import configure_from_args
+from helpers.file_handler import parse_args, parse_option
+from helpers.instrumentation import run_with_instrumentation
 from graph import DirectedGraph
 
 
@@ -6,24 +8,28 @@ from graph import DirectedGraph
 # python nntask2.py input1=input41.txt output1=output1.txt input2=input42.txt output2=output2.txt
 def main():
     input1, input2, input3, output1, output2 = parse_args()
+    configure_from_args()
+    backend = parse_option("backend", "dict")  # dict или csr
+    snapshot = parse_option("snapshot", "0") == "1"  # Кэшировать разобранный граф в бинарном снимке
+    shared = parse_option("shared", "0") == "1"  # Выводить общие подвыражения один раз
     print(f"Входные файлы: {input1}, {input2}")
     print(f"Выходные файлы: {output1}, {output2}")
 
-    graph = DirectedGraph(input1 if input1 else "input41.txt")
+    graph = DirectedGraph(input1 if input1 else "input41.txt", backend=backend, snapshot=snapshot)
     if not graph.has_cycle():
-        prefix_notation = graph.to_prefix_notation()
+        prefix_notation = graph.to_prefix_notation(shared=shared)
         graph.display_graph()
         print("Префиксное представление графа:", prefix_notation)
-        graph.save_prefix_notation_to_file(output1 if output1 else "output.txt")
+        graph.save_prefix_notation_to_file(output1 if output1 else "output.txt", shared=shared)
 
     if input2 and output2:
         print("------Второй граф------")
-        graph = DirectedGraph(input2)
+        graph = DirectedGraph(input2, backend=backend, snapshot=snapshot)
         if not graph.has_cycle():
-            prefix_notation = graph.to_prefix_notation()
+            prefix_notation = graph.to_prefix_notation(shared=shared)
             print("Префиксное представление графа:", prefix_notation)
-            graph.save_prefix_notation_to_file(output2)
+            graph.save_prefix_notation_to_file(output2, shared=shared)
 
 
 if __name__ == '__main__':
-    main()
+    run_with_instrumentation(main)
@@ -1,8 +1,17 @@
-from helpers.file_handler import parse_args
+from helpers.error_sink import configure_from_args
+from helpers.file_handler import parse_args, parse_option
+from helpers.instrumentation import run_with_instrumentation
 from graph import DirectedGraph
+from operation_tape import OperationTape
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import io
+import json
 import math
+import os
 import re
 
+CHUNK_SIZE = 1024  # Вершин в одной порции при параллельном вычислении уровня
+
 
 def load_operations_from_file(operations_file):
     operations = {}
@@ -38,72 +47,359 @@ def save_result(output_file, result):
         file.write(str(result))
 
 
+def load_operation_files_list(list_file):
+    # Файл со списком файлов операций: по одному пути в строке
+    try:
+        with open(list_file, 'r') as file:
+            return [line.strip() for line in file if line.strip()]
+    except FileNotFoundError:
+        print(f"Файл не найден: {list_file}")
+        return []
+
+
+def save_batch_results(output_file, results):
+    with open(output_file, "w") as file:
+        file.write("\n".join(str(float(result)) for result in results))
+
+
+def save_gradient(output_file, gradient):
+    with open(output_file, "w", encoding="utf-8") as file:
+        json.dump(gradient, file, ensure_ascii=False, indent=4)
+
+
+def evaluate_chunk(chunk):
+    # Порция вершин одного уровня: пары (операция, значения входящих вершин). Выполняется
+    # в потоке или процессе пула, поэтому без обращения к графу; вычисления те же, что
+    # и в apply_operation (операции уже проверены), результат совпадает побитово
+    results = []
+    for operation, children_values in chunk:
+        if operation == "+":
+            results.append(sum(children_values))
+        elif operation == "*":
+            result = 1
+            for value in children_values:
+                result *= value
+            results.append(result)
+        else:
+            results.append(math.exp(children_values[0]))
+    return results
+
+
 class DirectedGraphWithOperations(DirectedGraph):
-    def __init__(self, file_path, operations_file):
-        super().__init__(file_path)
-        self.operations = load_operations_from_file(operations_file)
+    def __init__(self, file_path, operations_file, backend='dict', snapshot=False):
+        super().__init__(file_path, backend=backend, snapshot=snapshot)
+        with self.metrics.stage("operations.load"):
+            self.operations = load_operations_from_file(operations_file)
+        self.values = {}  # Кэш вычисленных значений вершин для топологического режима
 
-    def to_prefix_with_operations(self):
+    def format_operation(self, node, children_str):
+        """
+        Построение выражения для вершины по уже построенным выражениям входящих вершин.
+        Вершины обходятся без рекурсии в топологическом порядке, найденном в has_cycle.
+
+        :param node: текущая вершина графа
+        :param children_str: выражения входящих вершин в порядке порядковых номеров дуг
+        :return: строковое представление выражения для данной вершины
+        """
+        # Получаем операцию или значение для текущей вершины
+        operation = self.operations.get(node, node)
+
+        # Если операция числовая, возвращаем её как строку
+        if isinstance(operation, (int, float)):
+            return str(operation)
+
+        # Формируем строку в зависимости от операции
+        if operation == '+':
+            # Суммируем значения дочерних вершин
+            return f"({' + '.join(children_str)})"
+        elif operation == '*':
+            # Перемножаем значения дочерних вершин
+            return f"({' * '.join(children_str)})"
+        elif operation == 'exp':
+            # Проверяем, что операция экспоненты имеет ровно один аргумент
+            if len(children_str) != 1:
+                raise ValueError("Операция 'exp' должна иметь ровно один аргумент")
+            return f"exp({children_str[0]})"
+        else:
+            # Если операция неизвестна, возвращаем её как строку
+            return str(operation)
+
+    def to_prefix_with_operations(self, shared=False):
         """
         Метод преобразует граф операций в префиксную запись, где каждая вершина представлена операцией
         или значением.
+
+        :param shared: если True, общие подвыражения выводятся один раз отдельными строками-привязками
         """
+        buffer = io.StringIO()
+        self.write_prefix_with_operations(buffer, shared=shared)
+        return buffer.getvalue()
 
-        def dfs_with_operations(node):
-            """
-            Рекурсивный обход графа для построения выражения в префиксной записи.
+    def write_prefix_with_operations(self, file, shared=False):
+        """
+        Потоковая запись префиксной формы с операциями в открытый файл.
 
-            :param node: текущая вершина графа
-            :return: строковое представление выражения для данной вершины
-            """
-            # Получаем операцию или значение для текущей вершины
-            operation = self.operations.get(node, node)
+        :param file: файл (или другой объект с методом write) для записи
+        :param shared: если True, каждая вершина с операцией, на которую ссылаются несколько раз,
+                       записывается один раз строкой "v<вершина> = <выражение>", а последняя строка
+                       содержит выражение для синка
+        """
+        # Находим вершину без исходящих рёбер (синк)
+        sink = self.find_sink()
+        if not sink:
+            # Если синк не найден, выбрасываем исключение
+            raise ValueError("Не удалось найти конечную вершину графа.")
+
+        # Строим выражение от источников к найденному синку; к входящим вершинам констант не спускаемся
+        share = self.binding_writer(file) if shared else None
+        file.write(self.build_bottom_up(sink, self.format_operation, expand=self.is_expandable, share=share))
+
+    def save_prefix_with_operations_to_file(self, file_path, shared=False):
+        with open(file_path, 'w') as file:
+            self.write_prefix_with_operations(file, shared=shared)
+            print(f"Результат сохранён в файл: {file_path}")
+
+    def set_operation(self, node, operation):
+        """
+        Меняет операцию (или значение константы) вершины на месте.
+        Кэш значений сбрасывается только для этой вершины и зависящих от неё.
+
+        :param node: вершина графа
+        :param operation: число для константы или '+', '*', 'exp'
+        """
+        self.operations[node] = operation
+        self.invalidate(node, force=True)
 
-            # Если операция числовая, возвращаем её как строку
+    def invalidate(self, node, force=False):
+        """
+        Удаляет из кэша self.values значения вершины и всех зависящих от неё вершин, чтобы
+        следующее вычисление пересчитало только этот «грязный» конус.
+
+        :param node: вершина, у которой изменились входящие дуги или операция
+        :param force: сбросить значение, даже если вершина — константа
+        """
+        # Значение константы не зависит от входящих дуг
+        if not force and not self.is_expandable(node):
+            return
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            # Незакэшированная вершина уже грязная: вершины, зависящие от неё через операции,
+            # тоже не могут быть в кэше
+            if self.values.pop(current, None) is None:
+                continue
+            for child, _ in self.graph.get(current, []):
+                if self.is_expandable(child):
+                    stack.append(child)
+
+    def is_expandable(self, node):
+        # Значение числовой константы не зависит от входящих вершин
+        return not isinstance(self.operations.get(node), (int, float))
+
+    def optimize(self, fold=True, dedup=True):
+        """
+        Однократная оптимизация графа операций после загрузки. Всегда удаляются вершины,
+        от которых синк не зависит (с учётом того, что к входящим вершинам констант вычисление
+        не спускается), дополнительно:
+        fold — свёртка подграфов из одних констант ('+', '*', 'exp') в числа; значения считаются
+        тем же apply_operation, поэтому результат вычисления совпадает побитово;
+        dedup — объединение структурно одинаковых вершин (hash-consing): одинаковые константы
+        и вершины с одной операцией над одними и теми же аргументами в том же порядке.
+
+        Оптимизация сохраняет только значение функции: граф после неё предназначен для вычисления.
+        Префиксные записи меняются — удаляются входящие вершины констант, объединённые вершины
+        выводятся под номером представителя, свёрнутые подвыражения заменяются числами, —
+        поэтому их нужно строить до вызова optimize. Свёртка и объединение закрепляют значения
+        констант и сливают их производные, поэтому для evaluate_batch с другими файлами операций
+        и для gradient годится только удаление (fold=False, dedup=False).
+
+        :return: словарь с числом вершин и рёбер до и после и числом свёрнутых и объединённых вершин
+        """
+        sink = self.find_sink()
+        if not sink:
+            raise ValueError("Не удалось найти конечную вершину графа.")
+        with self.metrics.stage("operations.optimize"):
+            report = {"nodes_before": len(self.graph),
+                      "edges_before": sum(len(edges) for edges in self.graph.values()),
+                      "folded": 0, "merged": 0}
+            self._ensure_mutable()
+            order = self.ancestors_in_order(sink, expand=self.is_expandable)
+
+            if fold:
+                for node in order:
+                    if self._fold_constant(node):
+                        report["folded"] += 1
+                if report["folded"]:
+                    # Входящие вершины свёрнутых констант больше не нужны
+                    order = self.ancestors_in_order(sink, expand=self.is_expandable)
+
+            kept = set(order)
+            representative = {node: node for node in kept}
+            if dedup:
+                report["merged"] = self._merge_duplicates(order, representative)
+                kept = {node for node in kept if representative[node] == node}
+
+            self._rebuild(kept, representative)
+            report["nodes_after"] = len(self.graph)
+            report["edges_after"] = sum(len(edges) for edges in self.graph.values())
+        return report
+
+    def _fold_constant(self, node):
+        # Вершина с операцией, все входящие вершины которой — константы, заменяется числом.
+        # Неизвестные операции и ошибки вычисления (переполнение exp) оставляются как есть,
+        # чтобы при вычислении они проявились так же, как без оптимизации.
+        operation = self.operations.get(node)
+        incoming = self.get_incoming(node)
+        if operation not in ('+', '*', 'exp') or not incoming or (operation == 'exp' and len(incoming) != 1):
+            return False
+        values = [self.operations.get(parent) for parent, _ in incoming]
+        if not all(isinstance(value, (int, float)) for value in values):
+            return False
+        try:
+            self.operations[node] = self.apply_operation(node, operation, values)
+        except OverflowError:
+            return False
+        return True
+
+    def _merge_duplicates(self, order, representative):
+        # Вершины обходятся в топологическом порядке, поэтому аргументы каждой вершины уже
+        # заменены представителями. Порядок аргументов сохраняется: от него зависит порядок
+        # сложения и умножения чисел с плавающей точкой.
+        seen = {}
+        merged = 0
+        for node in order:
+            operation = self.operations.get(node)
+            if operation is None:
+                continue
             if isinstance(operation, (int, float)):
-                return str(operation)
-
-            # Получаем все входящие рёбра для текущей вершины
-            incoming = []
-            for parent, edges in self.graph.items():
-                for child, order in edges:
-                    if child == node:
-                        incoming.append((parent, order))
-            # Сортируем входящие рёбра по порядковому номеру (order)
-            incoming.sort(key=lambda x: x[1])
-
-            # Рекурсивно строим строковые выражения для всех входящих вершин
-            children_str = [dfs_with_operations(parent) for parent, _ in incoming]
-
-            # Формируем строку в зависимости от операции
-            if operation == '+':
-                # Суммируем значения дочерних вершин
-                return f"({' + '.join(children_str)})"
-            elif operation == '*':
-                # Перемножаем значения дочерних вершин
-                return f"({' * '.join(children_str)})"
-            elif operation == 'exp':
-                # Проверяем, что операция экспоненты имеет ровно один аргумент
-                if len(children_str) != 1:
-                    raise ValueError("Операция 'exp' должна иметь ровно один аргумент")
-                return f"exp({children_str[0]})"
+                key = ("const", float(operation))
             else:
-                # Если операция неизвестна, возвращаем её как строку
-                return str(operation)
+                key = (operation, tuple(representative[parent] for parent, _ in self.get_incoming(node)))
+            existing = seen.setdefault(key, node)
+            if existing != node:
+                representative[node] = existing
+                merged += 1
+        return merged
+
+    def _rebuild(self, kept, representative):
+        # Новые списки смежности только для оставшихся вершин: дуги объединённых вершин
+        # переходят к представителям, дуги от удалённых вершин не переносятся
+        graph = {node: [] for node in self.graph if node in kept}
+        for node in graph:
+            for parent, order in self.get_incoming(node):
+                parent = representative.get(parent, parent)
+                if parent in graph:
+                    graph[parent].append((node, order))
+
+        self.graph = graph
+        self._sort_adjacency()
+        self.operations = {node: operation for node, operation in self.operations.items() if node in graph}
+        self.values = {}
+        self.topological_order = None
+        self._topological_index = None
+        self.has_cycle(verbose=False)
+
+    def compile(self):
+        """
+        Компилирует граф один раз в ленту инструкций для многократного пакетного вычисления
+        с разными наборами констант (см. OperationTape.evaluate_batch).
 
-        # Находим вершину без исходящих рёбер (синк)
+        :return: OperationTape
+        """
         sink = self.find_sink()
         if not sink:
-            # Если синк не найден, выбрасываем исключение
             raise ValueError("Не удалось найти конечную вершину графа.")
+        with self.metrics.stage("operations.compile"):
+            return OperationTape.compile(self, sink)
+
+    def evaluate_batch(self, operations_files):
+        """
+        Вычисляет функцию для набора файлов операций с той же структурой графа.
+        Из каждого файла берутся только значения констант.
 
-        # Начинаем построение выражения с найденного синка
-        return dfs_with_operations(sink)
+        :param operations_files: список путей к файлам операций
+        :return: массив NumPy с результатом для каждого файла
+        """
+        tape = self.compile()
+        vectors = [tape.constants_vector(load_operations_from_file(path)) for path in operations_files]
+        with self.metrics.stage("operations.evaluate_batch"):
+            return tape.evaluate_batch(vectors)
 
-    def evaluate_function(self):
+    def apply_operation(self, node, operation, children_values):
+        """
+        Применяет операцию вершины к уже вычисленным значениям её входящих вершин.
+
+        :param node: вершина графа (используется в сообщениях об ошибках)
+        :param operation: операция вершины ('+', '*' или 'exp')
+        :param children_values: значения входящих вершин в порядке порядковых номеров дуг
+        :return: результат вычисления для данной вершины
+        """
+        # Применяем операцию в зависимости от её типа
+        if operation == "+":
+            # Сложение всех дочерних значений
+            return sum(children_values)
+        elif operation == "*":
+            # Умножение всех дочерних значений
+            result = 1
+            for value in children_values:
+                result *= value
+            return result
+        elif operation == "exp":
+            # Вычисление экспоненты (e^x) для одного аргумента
+            if len(children_values) != 1:
+                # Логируем ошибку и выбрасываем исключение, если аргументов не один
+                self.log_error("Операция 'exp' должна иметь ровно один аргумент")
+                raise ValueError("Операция 'exp' должна иметь ровно один аргумент")
+            return math.exp(children_values[0])
+        else:
+            # Если операция неизвестна, логируем ошибку и выбрасываем исключение
+            self.log_error(f"Неизвестная операция '{operation}' для вершины {node}")
+            raise ValueError(f"Неизвестная операция '{operation}' для вершины {node}")
+
+    def evaluation_order(self, sink):
+        """
+        Итеративный обход в глубину от синка по обратному индексу.
+        Возвращает ещё не вычисленные вершины, от которых зависит синк, в топологическом порядке
+        (каждая вершина идёт после всех своих входящих вершин). Уже закэшированные вершины
+        и входящие вершины констант не обходятся.
+
+        :param sink: конечная вершина графа
+        :return: список вершин в порядке вычисления
+        """
+        order = []
+        visited = set(self.values)
+        stack = [(sink, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                # Все входящие вершины уже в списке, можно добавлять саму вершину
+                order.append(node)
+                continue
+            if node in visited:
+                continue
+            visited.add(node)
+            stack.append((node, True))
+
+            if not self.is_expandable(node):
+                continue
+            for parent, _ in reversed(self.get_incoming(node)):
+                if parent not in visited:
+                    stack.append((parent, False))
+        return order
+
+    def evaluate_function(self, mode="recursive", pool="thread", workers=None, chunk_size=CHUNK_SIZE):
         """
         Метод вычисляет значение функции, представленной графом операций.
         Обходит граф начиная с конечной вершины (синка) и применяет операции рекурсивно.
+
+        :param mode: 'recursive' — рекурсивный обход от синка;
+                     'topological' — итеративное вычисление каждой вершины ровно один раз
+                     в топологическом порядке с сохранением значений в self.values;
+                     'parallel' — вычисление по уровням независимых вершин в пуле (evaluate_parallel)
+        :param pool: для режима 'parallel' — 'thread' или 'process'
+        :param workers: для режима 'parallel' — размер пула (по умолчанию число процессоров)
+        :param chunk_size: для режима 'parallel' — вершин в одной порции
+        :return: значение функции в синке
         """
 
         def evaluate(node):
@@ -123,42 +419,13 @@ class DirectedGraphWithOperations(DirectedGraph):
             if isinstance(operation, (int, float)):
                 return operation
 
-            # Инициализируем список для хранения входящих рёбер
-            incoming = []
-            # Перебираем все рёбра графа
-            for parent, edges in self.graph.items():
-                # Перебираем рёбра для текущей вершины
-                for child, order in edges:
-                    # Если ребро ведёт к искомой вершине, добавляем его
-                    if child == node:
-                        incoming.append((parent, order))
-            # Сортируем входящие рёбра по порядковому номеру (order)
-            incoming.sort(key=lambda x: x[1])
+            # Входящие рёбра берём из обратного индекса (уже отсортированы по порядковому номеру)
+            incoming = self.get_incoming(node)
 
             # Рекурсивно вычисляем значения для всех дочерних вершин
             children_values = [evaluate(parent) for parent, _ in incoming]
 
-            # Применяем операцию в зависимости от её типа
-            if operation == "+":
-                # Сложение всех дочерних значений
-                return sum(children_values)
-            elif operation == "*":
-                # Умножение всех дочерних значений
-                result = 1
-                for value in children_values:
-                    result *= value
-                return result
-            elif operation == "exp":
-                # Вычисление экспоненты (e^x) для одного аргумента
-                if len(children_values) != 1:
-                    # Логируем ошибку и выбрасываем исключение, если аргументов не один
-                    self.log_error("Операция 'exp' должна иметь ровно один аргумент")
-                    raise ValueError("Операция 'exp' должна иметь ровно один аргумент")
-                return math.exp(children_values[0])
-            else:
-                # Если операция неизвестна, логируем ошибку и выбрасываем исключение
-                self.log_error(f"Неизвестная операция '{operation}' для вершины {node}")
-                raise ValueError(f"Неизвестная операция '{operation}' для вершины {node}")
+            return self.apply_operation(node, operation, children_values)
 
         # Находим вершину без исходящих рёбер (синк)
         sink = self.find_sink()
@@ -166,28 +433,252 @@ class DirectedGraphWithOperations(DirectedGraph):
             # Если конечная вершина (синк) не найдена, выбрасываем исключение
             raise ValueError("Не удалось найти конечную вершину графа.")
 
-        # Начинаем вычисление с найденной конечной вершины
-        return evaluate(sink)
+        if mode == "recursive":
+            # Начинаем вычисление с найденной конечной вершины
+            with self.metrics.stage("operations.evaluate_recursive"):
+                return evaluate(sink)
+        if mode == "topological":
+            with self.metrics.stage("operations.evaluate_topological"):
+                return self.evaluate_topological(sink)
+        if mode == "parallel":
+            with self.metrics.stage("operations.evaluate_parallel"):
+                return self.evaluate_parallel(sink, pool=pool, workers=workers, chunk_size=chunk_size)
+        raise ValueError(f"Неизвестный режим вычисления '{mode}'")
+
+    def evaluate_topological(self, sink):
+        """
+        Вычисляет вершины, от которых зависит синк, в топологическом порядке без рекурсии.
+        Каждая вершина вычисляется один раз, результаты сохраняются в кэше self.values,
+        поэтому общие подграфы не пересчитываются.
+
+        :param sink: конечная вершина графа
+        :return: значение функции в синке
+        """
+        values = self.values
+        order = self.evaluation_order(sink)
+        self.metrics.count("operations.nodes_evaluated", len(order))
+        for node in order:
+            operation = self.operations.get(node)
+            if operation is None:
+                raise ValueError(f"Операция для вершины {node} не найдена")
+
+            if isinstance(operation, (int, float)):
+                values[node] = operation
+                continue
+
+            children_values = [values[parent] for parent, _ in self.get_incoming(node)]
+            values[node] = self.apply_operation(node, operation, children_values)
+        return values[sink]
+
+    def evaluation_levels(self, sink):
+        """
+        Разбиение ещё не вычисленных вершин, от которых зависит синк, на уровни (волновые фронты):
+        константы — уровень 0, вершина с операцией — на единицу больше наибольшего уровня
+        её входящих вершин. Вершины одного уровня не зависят друг от друга.
+
+        :param sink: конечная вершина графа
+        :return: список уровней, каждый — список вершин в топологическом порядке
+        """
+        level_of = {}
+        levels = [[]]
+        for node in self.evaluation_order(sink):
+            operation = self.operations.get(node)
+            if operation is None:
+                raise ValueError(f"Операция для вершины {node} не найдена")
+            if isinstance(operation, (int, float)):
+                level = 0
+            else:
+                # Уже закэшированные входящие вершины не входят в порядок и уровня не имеют
+                level = 1 + max((level_of.get(parent, 0) for parent, _ in self.get_incoming(node)), default=0)
+            level_of[node] = level
+            if level == len(levels):
+                levels.append([])
+            levels[level].append(node)
+        return levels
+
+    def evaluate_parallel(self, sink, pool="thread", workers=None, chunk_size=CHUNK_SIZE, min_level_size=None):
+        """
+        Вычисление по уровням: вершины уровня делятся на порции по chunk_size и вычисляются
+        в пуле потоков или процессов (evaluate_chunk), следующий уровень начинается после
+        завершения предыдущего. Уровни меньше min_level_size (по умолчанию две порции)
+        вычисляются последовательно — для них передача в пул дороже самих операций.
+        Значения совпадают с evaluate_topological и так же сохраняются в self.values.
+
+        Операции над числами Python выполняются под GIL, поэтому пул потоков ускоряет
+        вычисление только на сборках без GIL; пул процессов обходит GIL, но платит за
+        передачу значений входящих вершин, так что выигрывает лишь на очень широких уровнях.
+
+        :param sink: конечная вершина графа
+        :param pool: 'thread' или 'process'
+        :param workers: размер пула (по умолчанию число процессоров)
+        :param chunk_size: вершин в одной порции
+        :param min_level_size: наименьший размер уровня, который передаётся в пул
+        :return: значение функции в синке
+        """
+        if pool not in ("thread", "process"):
+            raise ValueError(f"Неизвестный пул '{pool}', допустимы 'thread' и 'process'")
+        workers = workers or os.cpu_count() or 1
+        min_level_size = 2 * chunk_size if min_level_size is None else min_level_size
+        values = self.values
+        levels = self.evaluation_levels(sink)
+        self.metrics.count("operations.nodes_evaluated", sum(len(level) for level in levels))
+        self.metrics.count("operations.levels", len(levels))
+
+        executor = None
+        try:
+            for level in levels:
+                if len(level) < min_level_size or workers == 1:
+                    # Узкий уровень — вычисляем на месте, как в evaluate_topological
+                    for node in level:
+                        operation = self.operations[node]
+                        if isinstance(operation, (int, float)):
+                            values[node] = operation
+                        else:
+                            children_values = [values[parent] for parent, _ in self.get_incoming(node)]
+                            values[node] = self.apply_operation(node, operation, children_values)
+                    continue
+
+                tasks = []
+                for node in level:
+                    operation = self.operations[node]
+                    if isinstance(operation, (int, float)):
+                        values[node] = operation
+                        continue
+                    children_values = [values[parent] for parent, _ in self.get_incoming(node)]
+                    if operation not in ("+", "*", "exp") or (operation == "exp" and len(children_values) != 1):
+                        # Ошибка записывается в журнал и выбрасывается так же, как при последовательном вычислении
+                        self.apply_operation(node, operation, children_values)
+                    tasks.append((operation, children_values))
+                if not tasks:
+                    # Уровень 0 — только константы, на остальных уровнях констант нет
+                    continue
+
+                if executor is None:
+                    # Пул создаётся только при первом широком уровне
+                    executor = (ThreadPoolExecutor if pool == "thread" else ProcessPoolExecutor)(max_workers=workers)
+                self.metrics.count("operations.parallel_levels")
+                chunks = [tasks[start:start + chunk_size] for start in range(0, len(tasks), chunk_size)]
+                results = executor.map(evaluate_chunk, chunks)
+                for node, result in zip(level, (result for chunk in results for result in chunk)):
+                    values[node] = result
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return values[sink]
+
+    def gradient(self):
+        """
+        Обратный проход (reverse mode): производные значения синка по всем константным вершинам.
+        Использует значения прямого прохода из кэша self.values (при необходимости выполняет
+        прямой проход), поэтому стоит примерно столько же, сколько одно вычисление функции.
+
+        :return: словарь {константная вершина: d(синк)/d(константа)}
+        """
+        sink = self.find_sink()
+        if not sink:
+            raise ValueError("Не удалось найти конечную вершину графа.")
+        with self.metrics.stage("operations.gradient"):
+            return self._gradient(sink)
+
+    def _gradient(self, sink):
+        self.evaluate_topological(sink)
+
+        values = self.values
+        order = self.ancestors_in_order(sink, expand=self.is_expandable)
+        adjoints = {sink: 1.0}
+        for node in reversed(order):
+            # Все потребители вершины уже обработаны, её сопряжённое значение окончательное
+            adjoint = adjoints.get(node, 0.0)
+            operation = self.operations.get(node)
+            if isinstance(operation, (int, float)):
+                continue
+
+            parents = [parent for parent, _ in self.get_incoming(node)]
+            if operation == "+":
+                # d(a + b + ...)/da = 1
+                for parent in parents:
+                    adjoints[parent] = adjoints.get(parent, 0.0) + adjoint
+            elif operation == "*":
+                # d(a * b * ...)/da = произведение остальных множителей; считаем через префиксные
+                # и суффиксные произведения, чтобы не делить на значение (оно может быть нулём)
+                prefix = [1.0]
+                for parent in parents:
+                    prefix.append(prefix[-1] * values[parent])
+                suffix = 1.0
+                for position in range(len(parents) - 1, -1, -1):
+                    parent = parents[position]
+                    adjoints[parent] = adjoints.get(parent, 0.0) + adjoint * prefix[position] * suffix
+                    suffix *= values[parent]
+            elif operation == "exp":
+                # d(exp(a))/da = exp(a), значение уже посчитано в прямом проходе
+                parent = parents[0]
+                adjoints[parent] = adjoints.get(parent, 0.0) + adjoint * values[node]
+
+        return {node: adjoints.get(node, 0.0) for node in order
+                if isinstance(self.operations.get(node), (int, float))}
 
 
  # python nntask3.py input1=input41.txt input2=input42.txt output1=output.txt
+ # python nntask3.py input1=input41.txt input2=input42.txt output1=output.txt input3=operations_list.txt output2=batch.txt
+ # python nntask3.py input1=input41.txt input2=input42.txt output1=output.txt gradient=gradient.json
+ # python nntask3.py input1=input41.txt input2=input42.txt output1=output.txt optimize=1
+ # python nntask3.py input1=input41.txt input2=input42.txt output1=output.txt parallel=process workers=4 chunk_size=1024
 def main():
     input1, input2, input3, output1, output2 = parse_args()
+    configure_from_args()
+    backend = parse_option("backend", "dict")  # dict или csr
+    snapshot = parse_option("snapshot", "0") == "1"  # Кэшировать разобранный граф в бинарном снимке
+    shared = parse_option("shared", "0") == "1"  # Выводить общие подвыражения один раз
+    gradient_file = parse_option("gradient")  # Файл для производных по константам
+    # optimize=1 — удаление лишних вершин, свёртка констант и объединение одинаковых вершин;
+    # optimize=prune — только удаление, optimize=prune,fold или prune,dedup — выборочно
+    optimize = parse_option("optimize", "0")
+    optimize = ("prune", "fold", "dedup") if optimize == "1" else tuple(optimize.split(",")) if optimize != "0" else ()
+    # parallel=thread или parallel=process — вычисление по уровням в пуле из workers потоков
+    # (процессов) порциями по chunk_size вершин
+    pool = parse_option("parallel")
+    workers = int(parse_option("workers", "0")) or None
+    chunk_size = int(parse_option("chunk_size", str(CHUNK_SIZE)))
     print(f"Входные файлы: {input1}, {input2}")
     print(f"Выходные файлы: {output1}, {output2}")
 
-    graph = DirectedGraphWithOperations(input1, input2)
+    graph = DirectedGraphWithOperations(input1, input2, backend=backend, snapshot=snapshot)
     if not graph.has_cycle():
-        prefix_notation = graph.to_prefix_notation()
+        # Префиксные записи строятся по исходному графу: оптимизация меняет их вид
+        prefix_notation = graph.to_prefix_notation(shared=shared)
         print("Префиксное представление графа:", prefix_notation)
 
-        prefix_with_operations = graph.to_prefix_with_operations()
+        prefix_with_operations = graph.to_prefix_with_operations(shared=shared)
         print("Функция с операциями:", prefix_with_operations)
 
-        result = graph.evaluate_function()
+        if optimize:
+            # При пакетном вычислении константы берутся из других файлов, а производные нужны
+            # по каждой исходной константе, поэтому сворачивать и объединять их нельзя —
+            # остаётся только удаление лишних вершин
+            keep_constants = bool(input3 and output2) or bool(gradient_file)
+            report = graph.optimize(fold="fold" in optimize and not keep_constants,
+                                    dedup="dedup" in optimize and not keep_constants)
+            print(f"Оптимизация графа: вершин {report['nodes_before']} -> {report['nodes_after']}, "
+                  f"рёбер {report['edges_before']} -> {report['edges_after']}, "
+                  f"свёрнуто {report['folded']}, объединено {report['merged']}")
+
+        if pool:
+            result = graph.evaluate_function(mode="parallel", pool=pool, workers=workers, chunk_size=chunk_size)
+        else:
+            result = graph.evaluate_function(mode="topological")
         print("Результат вычисления функции:", result)
         save_result(output1, result)
 
+        if gradient_file:
+            save_gradient(gradient_file, graph.gradient())
+            print(f"Производные по константам сохранены в {gradient_file}")
+
+        # input3 — файл со списком файлов операций для пакетного вычисления, результаты в output2
+        if input3 and output2:
+            results = graph.evaluate_batch(load_operation_files_list(input3))
+            print("Результаты пакетного вычисления:", len(results))
+            save_batch_results(output2, results)
+
 
 if __name__ == '__main__':
-    main()
+    run_with_instrumentation(main)
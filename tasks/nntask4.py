@@ -1,89 +1,137 @@
 import json
 import numpy as np
-from helpers.file_handler import parse_args
-import math
+from helpers.error_sink import ErrorSink, configure_from_args
+from helpers.file_handler import error_file_path, parse_args
+from helpers.instrumentation import active as active_metrics, run_with_instrumentation
+from weights_format import is_binary_weights, load_binary_weights, network_structure, read_text_weights
 
 
 class NeuralNetwork:
-    def __init__(self, weights_file, input_vector_file):
+    def __init__(self, weights_file, input_vector_file=None):
         self.weights_file = weights_file
         self.input_vector_file = input_vector_file
-        self.error_file = f"error_{weights_file}"
-        self.first_error_log = True
-        self.layers = []
+        self.error_file = error_file_path(weights_file)
+        self.errors = ErrorSink(self.error_file)
+        self.metrics = active_metrics()
+        self.layers = []  # Матрицы весов слоёв формы (нейроны, входы)
+        self.layer_numbers = []  # Номера строк файла весов, из которых прочитаны слои
         self.input_vector = []
-        self.network_structure = {}
-        self.load_weights()
-        self.load_input_vector()
+        self.inputs = None  # Все входные векторы одной матрицей формы (число векторов, входы)
+        with self.metrics.stage("network.load_weights"):
+            self.load_weights()
+        self.layer_stages = [f"network.forward.layer{number}" for number in range(1, len(self.layers) + 1)]
+        if input_vector_file is not None:  # Без файла входов сеть используется сервером (nnserver.py)
+            with self.metrics.stage("network.load_inputs"):
+                self.load_input_vector()
+        self.valid = self.inputs is not None and self.validate_shapes(self.inputs.shape[1])
 
     def log_error(self, message):
-        mode = 'w' if self.first_error_log else 'a'
-        with open(self.error_file, mode, encoding='utf-8') as error_file:
-            error_file.write(message + "\n")
-        self.first_error_log = False
+        self.errors.log(message)
 
     def load_weights(self):
+        # Двоичный файл весов отображается в память без разбора и копирования,
+        # текстовый разбирается построчно (каждый нейрон — список весов)
         try:
-            with open(self.weights_file, 'r', encoding='utf-8') as file:
-                for layer_number, line in enumerate(file, start=1):
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        # Интерпретируем строку как список нейронов (каждый нейрон — список весов)
-                        layer = json.loads(f"[{line}]")
-                        self.layers.append(layer)
-                        self.network_structure[f"Layer {layer_number}"] = layer
-                    except Exception:
-                        self.log_error(f"Строка {layer_number}: некорректный формат матрицы весов '{line}'")
+            if is_binary_weights(self.weights_file):
+                self.layers = load_binary_weights(self.weights_file)
+                self.layer_numbers = list(range(1, len(self.layers) + 1))
+            else:
+                self.layers, self.layer_numbers = read_text_weights(self.weights_file, np.float64, self.log_error)
         except FileNotFoundError:
             self.log_error(f"Файл {self.weights_file} не найден.")
         except Exception as e:
             self.log_error(f"Произошла ошибка при загрузке весов: {e}")
 
     def load_input_vector(self):
+        # Файл может содержать несколько входных векторов, по одному в строке;
+        # все они вычисляются одним пакетным умножением матриц
         try:
+            vectors = []
             with open(self.input_vector_file, 'r', encoding='utf-8') as file:
-                line = file.readline().strip()
-                if not line:
-                    raise ValueError("Пустой входной файл.")
-                try:
-                    self.input_vector = [float(x) for x in line.split()]
-                except Exception:
-                    self.log_error(f"Некорректный формат входного вектора: '{line}'")
+                for line_number, line in enumerate(file, start=1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        vectors.append([float(x) for x in line.split()])
+                    except Exception:
+                        self.log_error(f"Некорректный формат входного вектора: '{line}'")
+            if not vectors:
+                raise ValueError("Пустой входной файл.")
+            if len({len(vector) for vector in vectors}) != 1:
+                raise ValueError("Входные векторы разной длины.")
+            self.inputs = np.array(vectors, dtype=np.float64)
+            self.input_vector = vectors[0]
         except FileNotFoundError:
             self.log_error(f"Файл {self.input_vector_file} не найден.")
         except Exception as e:
             self.log_error(f"Произошла ошибка при загрузке входного вектора: {e}")
 
+    def validate_shapes(self, size):
+        # Размерности проверяются один раз при загрузке: число входов каждого слоя
+        # должно совпадать с числом нейронов предыдущего слоя (для первого — с длиной вектора)
+        if not self.layers:
+            return False
+        for layer_number, layer in enumerate(self.layers, start=1):
+            if layer.shape[1] != size:
+                self.log_error(
+                    f"Ошибка на слое {layer_number}: "
+                    f"несоответствие размерностей (вход: {size}, веса: {layer.shape[1]})."
+                )
+                return False
+            size = layer.shape[0]
+        return True
+
     def activation_function(self, x):
-        # Функция активации
-        return 1 / (1 + math.exp(-x))
+        # Численно устойчивый сигмоид: экспонента берётся только от неположительных чисел,
+        # поэтому переполнения при больших по модулю аргументах не возникает
+        z = np.exp(-np.abs(x))
+        return np.where(x >= 0, 1 / (1 + z), z / (1 + z))
+
+    def propagate(self, vectors):
+        # Прямой проход для матрицы входов уже проверенной размерности; возвращает матрицу выходов
+        if not self.metrics.enabled:
+            for layer in self.layers:
+                vectors = self.activation_function(vectors @ layer.T)
+            return vectors
 
-    def forward_pass(self):
-        if not self.layers or not self.input_vector:
+        self.metrics.count("network.vectors", len(vectors))
+        for layer, stage in zip(self.layers, self.layer_stages):
+            with self.metrics.stage(stage):
+                vectors = self.activation_function(vectors @ layer.T)
+        return vectors
+
+    def forward_pass(self, inputs=None):
+        # Каждый слой — одно умножение матриц для всего пакета входных векторов
+        if not self.layers or (inputs is None and self.inputs is None):
             self.log_error("Отсутствуют веса или входной вектор.")
             return None
+        if inputs is None:
+            if not self.valid:
+                return None
+            vectors = self.inputs
+        else:
+            vectors = np.atleast_2d(np.asarray(inputs, dtype=np.float64))
+            if not self.validate_shapes(vectors.shape[1]):
+                return None
 
-        vector = self.input_vector
-        for layer_number, layer in enumerate(self.layers, start=1):
-            new_vector = []
-            for neuron_number, neuron_weights in enumerate(layer, start=1):
-                if len(neuron_weights) != len(vector):
-                    self.log_error(
-                        f"Ошибка на слое {layer_number}, нейрон {neuron_number}: "
-                        f"несоответствие размерностей (вход: {len(vector)}, веса: {len(neuron_weights)})."
-                    )
-                    return None
-                weighted_sum = sum(w * x for w, x in zip(neuron_weights, vector))
-                new_vector.append(self.activation_function(weighted_sum))
-            vector = new_vector
-        return vector
+        vectors = self.propagate(vectors)
+
+        # Для одного входного вектора результат остаётся одним списком, как и раньше
+        if len(vectors) == 1:
+            return vectors[0].tolist()
+        return vectors.tolist()
+
+    @property
+    def network_structure(self):
+        # Структура для вывода строится только по запросу, а не хранится второй копией весов
+        return network_structure(self.weights_file, self.layers, self.layer_numbers)
 
     def save_network_structure(self, output_file):
         try:
+            structure = self.network_structure
             with open(output_file, 'w', encoding='utf-8') as file:
-                json.dump(self.network_structure, file, ensure_ascii=False, indent=4)
+                json.dump(structure, file, ensure_ascii=False, indent=4)
             print(f"Структура сети успешно сохранена в {output_file}")
         except Exception as e:
             self.log_error(f"Ошибка при сохранении структуры сети: {e}")
@@ -102,12 +150,15 @@ class NeuralNetwork:
 
 
 # python nntask4.py input1=input41.txt input2=input42.txt output1=output.json output2=output2.json
+# Файл весов input1 может быть и в двоичном формате (см. convert_weights.py)
+# Во входном файле input2 может быть несколько векторов, по одному в строке
 def main():
     # input1 - Входной файл с матрицами весов
     # input2 - Входной файл с вектором
     # output1 - Выходной файл с сетью
     # output2 -  Выходной файл с вектором
     input1, input2, input3, output1, output2 = parse_args()
+    configure_from_args()
     print(f"Входные файлы: {input1}, {input2}")
     print(f"Выходные файлы: {output1}, {output2}")
 
@@ -117,4 +168,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    run_with_instrumentation(main)
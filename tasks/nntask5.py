@@ -1,7 +1,16 @@
+import copy
 import json
+import multiprocessing
 import numpy as np
 import math
-from helpers.file_handler import parse_args
+import os
+import time
+from multiprocessing import connection, shared_memory
+from dataset_store import WINDOW_ROWS, iter_window_batches, open_dataset, parse_dataset_line
+from helpers.error_sink import ErrorSink, configure_from_args
+from helpers.file_handler import error_file_path, parse_args, parse_option
+from helpers.instrumentation import NULL_METRICS, active as active_metrics, run_with_instrumentation
+from weights_format import is_binary_weights, load_binary_weights, network_structure, read_text_weights
 
 
 def read_from_text_file(filename):
@@ -15,45 +24,364 @@ def read_from_text_file(filename):
 
 
 
+def shared_array(shape, source=None, dtype=np.float64):
+    # Массив NumPy поверх блока разделяемой памяти; при source данные копируются в блок
+    size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    if source is not None:
+        array[...] = source
+    return block, array
+
+
+def attach_array(name, shape, dtype=np.float64):
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def parallel_worker(network, worker_id, workers, names, shapes, channel):
+    """
+    Процесс-обработчик параллельного обучения. Веса, примеры текущего пакета и буфер
+    градиентов процесса лежат в разделяемой памяти: на каждом шаге процесс читает текущие веса
+    без копирования, считает градиент по своей части пакета и записывает его в свой буфер.
+    По каналу channel процесс получает число примеров пакета (None — завершение)
+    и отвечает суммарной ошибкой своей части.
+    """
+    blocks = {}
+    arrays = {}
+    workspace = gradients = X = Y = None
+    try:
+        for key, name in names.items():
+            blocks[key], arrays[key] = attach_array(name, shapes[key], network.dtype)
+
+        layer_count = len(shapes["layers"])
+        network.layers = [arrays[("layer", i)] for i in range(layer_count)]
+        gradients = [arrays[("gradient", worker_id, i)] for i in range(layer_count)]
+        X, Y = arrays["batch_X"], arrays["batch_Y"]
+        # Рабочие буферы на часть пакета; градиенты пишутся сразу в разделяемую память
+        shard_size = -(-shapes["batch_X"][0] // workers)
+        workspace = TrainingWorkspace(network.layers, shard_size, network.dtype, gradients=gradients)
+        while True:
+            count = channel.recv()
+            if count is None:
+                break
+            # Пакет делится между процессами на непрерывные части одинакового размера
+            low, high = count * worker_id // workers, count * (worker_id + 1) // workers
+            if high > low:
+                batch = slice(low, high)
+                activations = workspace.forward(network.layers, X, batch)
+                _, error = workspace.backward(network.layers, activations, Y, batch)
+            else:
+                error = 0.0
+                for gradient in gradients:
+                    gradient.fill(0)
+            channel.send(float(error))
+    except EOFError:
+        # Основной процесс закрыл канал, не дождавшись завершения
+        pass
+    finally:
+        network.layers = None
+        workspace = gradients = X = Y = arrays = None
+        for block in blocks.values():
+            block.close()
+        channel.close()
+
+
+class ParallelTrainer:
+    """
+    Параллельное по данным обучение: пакет делится между процессами, их градиенты суммируются
+    в фиксированном порядке процессов и применяются к весам в разделяемой памяти.
+    При одинаковых числе процессов и seed результат воспроизводим.
+
+    Основной процесс ждёт ответы обработчиков вместе с их завершением, поэтому обработчик,
+    упавший с исключением или убитый (например, при нехватке памяти), не приводит к вечному
+    ожиданию: шаг записывает сбой в журнал ошибок и выбрасывает ChildProcessError.
+    """
+
+    def __init__(self, network, workers):
+        self.network = network
+        self.workers = workers
+        self.blocks = []
+        names, shapes = {}, {"layers": [layer.shape for layer in network.layers]}
+
+        def allocate(key, shape, source=None):
+            block, array = shared_array(shape, source, network.dtype)
+            self.blocks.append(block)
+            names[key], shapes[key] = block.name, shape
+            return array
+
+        # Веса переносятся в разделяемую память; сеть дальше обновляет их на месте
+        network.layers = [allocate(("layer", i), layer.shape, layer) for i, layer in enumerate(network.layers)]
+        self.gradients = [[allocate(("gradient", worker, i), layer.shape) for i, layer in enumerate(network.layers)]
+                          for worker in range(workers)]
+        # Буфер суммы градиентов процессов, выделяется один раз
+        self.total = [np.empty(layer.shape, dtype=network.dtype) for layer in network.layers]
+        # В разделяемую память копируется только текущий пакет, а не вся выборка:
+        # она может быть отображена с диска и не помещаться в память. Пакет не больше выборки,
+        # как и в последовательном train_step
+        batch_size = min(network.batch_size, len(network.X))
+        self.batch_X = allocate("batch_X", (batch_size, network.X.shape[1]))
+        self.batch_Y = allocate("batch_Y", (batch_size, network.Y.shape[1]))
+
+        # Процессам передаётся копия сети без весов и выборки — они берутся из разделяемой памяти
+        shell = copy.copy(network)
+        shell.layers = shell.X = shell.Y = shell.errors = None
+        self.channels = []
+        self.processes = []
+        worker_channels = []
+        for worker in range(workers):
+            channel, worker_channel = multiprocessing.Pipe()
+            self.channels.append(channel)
+            worker_channels.append(worker_channel)
+            self.processes.append(multiprocessing.Process(
+                target=parallel_worker, args=(shell, worker, workers, names, shapes, worker_channel), daemon=True))
+        for process in self.processes:
+            process.start()
+        # Концы каналов обработчиков нужны только им: без этого основной процесс не увидел бы
+        # закрытия канала при гибели обработчика
+        for worker_channel in worker_channels:
+            worker_channel.close()
+
+    def step(self, X, Y, batch):
+        count = self.copy_batch(X, batch, self.batch_X)
+        self.copy_batch(Y, batch, self.batch_Y)
+        errors = self.exchange(count)
+
+        # Сумма градиентов процессов в фиксированном порядке, в заранее выделенный буфер
+        for accumulated, gradient in zip(self.total, self.gradients[0]):
+            np.copyto(accumulated, gradient)
+        for worker_gradients in self.gradients[1:]:
+            for accumulated, gradient in zip(self.total, worker_gradients):
+                np.add(accumulated, gradient, out=accumulated)
+        self.network.apply_gradients(self.total, count)
+        return float(sum(errors))
+
+    def exchange(self, count):
+        # Отправляет задание всем обработчикам и ждёт ответа каждого; ошибки возвращаются
+        # в порядке процессов. Готовность канала ждём вместе с завершением процессов.
+        try:
+            for channel in self.channels:
+                channel.send(count)
+            errors = [None] * self.workers
+            pending = dict(zip(self.channels, range(self.workers)))
+            sentinels = {process.sentinel: worker for worker, process in enumerate(self.processes)}
+            while pending:
+                for ready in connection.wait(list(pending) + list(sentinels)):
+                    if ready in pending:
+                        errors[pending.pop(ready)] = ready.recv()
+                    elif sentinels[ready] in pending.values():
+                        raise EOFError
+            return errors
+        except (EOFError, OSError):
+            self.fail()
+
+    def fail(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        codes = ", ".join(str(process.exitcode) for process in self.processes)
+        message = f"Параллельное обучение прервано: процесс-обработчик завершился аварийно (коды завершения: {codes})"
+        self.network.log_error(message)
+        raise ChildProcessError(message)
+
+    @staticmethod
+    def copy_batch(source, batch, buffer):
+        # Примеры пакета копируются в начало буфера; возвращается их число
+        if isinstance(batch, slice):
+            rows = source[batch]
+            buffer[:len(rows)] = rows
+            return len(rows)
+        np.take(source, batch, axis=0, out=buffer[:len(batch)])
+        return len(batch)
+
+    def close(self):
+        for channel in self.channels:
+            try:
+                channel.send(None)
+            except OSError:
+                # Обработчик уже завершился после сбоя
+                pass
+        for process in self.processes:
+            process.join()
+        for channel in self.channels:
+            channel.close()
+
+        # Веса копируются из разделяемой памяти обратно в обычные массивы
+        self.network.layers = [layer.copy() for layer in self.network.layers]
+        self.gradients = self.total = self.batch_X = self.batch_Y = None
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+
+class TrainingWorkspace:
+    """
+    Заранее выделенные буферы активаций, ошибок, дельт и градиентов для шага обучения.
+    Размеры определяются один раз по формам слоёв и размеру пакета, все вычисления
+    выполняются на месте через out=, поэтому шаг обучения не создаёт новых массивов.
+    Для неполного последнего пакета используются срезы тех же буферов.
+    """
+
+    def __init__(self, layers, batch_size, dtype=np.float64, gradients=None, metrics=NULL_METRICS):
+        sizes = [layers[0].shape[1]] + [layer.shape[0] for layer in layers]
+        self.dtype = dtype
+        self.metrics = metrics
+        # Имена этапов по слоям строятся один раз, а не на каждом шаге
+        self.forward_stages = [f"train.forward.layer{number}" for number in range(1, len(layers) + 1)]
+        self.backward_stages = [f"train.backward.layer{number}" for number in range(1, len(layers) + 1)]
+        self.activations = [np.empty((batch_size, size), dtype=dtype) for size in sizes]
+        self.errors = [np.empty((batch_size, size), dtype=dtype) for size in sizes[1:]]
+        self.deltas = [np.empty((batch_size, size), dtype=dtype) for size in sizes[1:]]
+        self.scratch = [np.empty((batch_size, size), dtype=dtype) for size in sizes[1:]]
+        self.targets = np.empty((batch_size, sizes[-1]), dtype=dtype)
+        self.sample_errors = np.empty(batch_size, dtype=dtype)
+        if gradients is None:
+            gradients = [np.empty(layer.shape, dtype=dtype) for layer in layers]
+        self.gradients = gradients
+
+    def forward(self, layers, X, batch):
+        # batch — срез или массив номеров примеров; выборка копируется в буфер входов без выделения памяти
+        activations = self.take(X, batch, self.activations[0])
+        count = len(activations)
+        result = [activations]
+        # В горячем цикле время замеряется только при включённой инструментации
+        timed = self.metrics.enabled
+        for layer, buffer, stage in zip(layers, self.activations[1:], self.forward_stages):
+            output = buffer[:count]
+            if timed:
+                started = time.perf_counter()
+            np.dot(activations, layer.T, out=output)
+            # Сигмоид на месте: 1 / (1 + exp(-x))
+            np.negative(output, out=output)
+            np.exp(output, out=output)
+            output += 1
+            np.reciprocal(output, out=output)
+            if timed:
+                self.metrics.add_time(stage, time.perf_counter() - started)
+            result.append(output)
+            activations = output
+        return result
+
+    def backward(self, layers, activations, Y, batch):
+        # Суммы градиентов по примерам пакета записываются в self.gradients;
+        # возвращается (градиенты, суммарная ошибка пакета)
+        count = len(activations[0])
+        last = len(layers) - 1
+        expected = self.take(Y, batch, self.targets)
+
+        errors = [buffer[:count] for buffer in self.errors]
+        deltas = [buffer[:count] for buffer in self.deltas]
+        # Этап слоя — вычисление его ошибки и дельты, начиная с выходного слоя
+        timed = self.metrics.enabled
+        if timed:
+            started = time.perf_counter()
+        np.subtract(expected, activations[-1], out=errors[last])  # Ошибка выходного слоя
+        self.multiply_by_derivative(errors[last], activations[-1], deltas[last], last, count)
+        if timed:
+            self.metrics.add_time(self.backward_stages[last], time.perf_counter() - started)
+
+        # Обратное распространение ошибки
+        for i in range(last, 0, -1):
+            if timed:
+                started = time.perf_counter()
+            np.dot(deltas[i], layers[i], out=errors[i - 1])  # Ошибка предыдущего слоя
+            self.multiply_by_derivative(errors[i - 1], activations[i], deltas[i - 1], i - 1, count)
+            if timed:
+                self.metrics.add_time(self.backward_stages[i - 1], time.perf_counter() - started)
+
+        if timed:
+            started = time.perf_counter()
+        for i in range(len(layers)):
+            np.dot(deltas[i].T, activations[i], out=self.gradients[i])
+        if timed:
+            self.metrics.add_time("train.gradients", time.perf_counter() - started)
+
+        # Сумма по примерам пакета средней абсолютной ошибки каждого примера
+        magnitude = self.scratch[0][:count]
+        np.abs(errors[0], out=magnitude)
+        sample_errors = self.sample_errors[:count]
+        np.mean(magnitude, axis=1, out=sample_errors)
+        return self.gradients, np.sum(sample_errors)
+
+    def multiply_by_derivative(self, error, activation, out, layer, count):
+        # out = error * activation * (1 - activation), производная сигмоида через его значение
+        derivative = self.scratch[layer][:count]
+        np.subtract(1, activation, out=derivative)
+        np.multiply(activation, derivative, out=derivative)
+        np.multiply(error, derivative, out=out)
+
+    @staticmethod
+    def take(source, batch, buffer):
+        if isinstance(batch, slice):
+            # Срез выборки — представление без копирования
+            return source[batch]
+        view = buffer[:len(batch)]
+        np.take(source, batch, axis=0, out=view)
+        return view
+
+
 class NeuralNetwork:
-    def __init__(self, weights_file, dataset_file, iterations, learning_rate=0.1):
+    def __init__(self, weights_file, dataset_file, iterations, learning_rate=0.1,
+                 batch_size=1, shuffle=False, seed=None, workers=1, dtype=np.float64,
+                 checkpoint_file=None, checkpoint_every=100, resume=False,
+                 stream=False, window_rows=WINDOW_ROWS):
         self.weights_file = weights_file
         self.dataset_file = dataset_file
         self.iterations = iterations
         self.learning_rate = learning_rate
+        self.batch_size = batch_size  # 1 — стохастический спуск по одному примеру, как раньше
+        self.shuffle = shuffle  # Перемешивать выборку перед каждой эпохой
+        self.rng = np.random.default_rng(seed)
+        self.workers = workers  # Число процессов для параллельного по данным обучения
+        self.dtype = np.dtype(dtype)  # float32 вдвое сокращает память и объём передаваемых данных
+        self.workspace = None  # Буферы шага обучения, создаются при первом шаге
+        self.checkpoint_file = checkpoint_file  # Файл контрольной точки (.npz), None — без контрольных точек
+        self.checkpoint_every = checkpoint_every  # Период сохранения в итерациях
+        self.resume = resume  # Продолжить обучение с контрольной точки
+        self.stream = stream  # Читать выборку из двоичного файла через mmap, не загружая её в память
+        self.window_rows = window_rows  # Размер окна перемешивания при потоковом чтении
         self.layers = []
-        self.dataset = []
-        self.network_structure = {}
-        self.error_file = f"error_{weights_file}"
-        self.first_error_log = True
-        self.load_weights()
-        self.load_dataset()
+        self.layer_numbers = []  # Номера строк файла весов, из которых прочитаны слои
+        self.X = None  # Входы обучающей выборки, матрица (число примеров, входы)
+        self.Y = None  # Ожидаемые выходы, матрица (число примеров, выходы)
+        self.error_file = error_file_path(weights_file)
+        self.errors = ErrorSink(self.error_file)
+        self.metrics = active_metrics()
+        with self.metrics.stage("network.load_weights"):
+            self.load_weights()
+        with self.metrics.stage("network.load_dataset"):
+            self.load_dataset()
 
     def log_error(self, message):
-        mode = 'w' if self.first_error_log else 'a'
-        with open(self.error_file, mode, encoding='utf-8') as error_file:
-            error_file.write(message + "\n")
-        self.first_error_log = False
+        self.errors.log(message)
 
     def load_weights(self):
+        # Двоичный файл весов отображается с копированием при записи: обучение меняет веса
+        # на месте, не затрагивая файл; при другом типе данных матрицы приводятся к self.dtype
         try:
-            with open(self.weights_file, 'r', encoding='utf-8') as file:
-                for layer_number, line in enumerate(file, start=1):
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        layer = json.loads(f"[{line}]")
-                        self.layers.append(np.array(layer, dtype=np.float64))
-                        self.network_structure[f"Layer {layer_number}"] = layer
-                    except Exception:
-                        self.log_error(f"Строка {layer_number}: некорректный формат матрицы весов '{line}'")
+            if is_binary_weights(self.weights_file):
+                self.layers = [layer if layer.dtype == self.dtype else layer.astype(self.dtype)
+                               for layer in load_binary_weights(self.weights_file, writable=True)]
+                self.layer_numbers = list(range(1, len(self.layers) + 1))
+            else:
+                self.layers, self.layer_numbers = read_text_weights(self.weights_file, self.dtype, self.log_error)
         except FileNotFoundError:
             self.log_error(f"Файл {self.weights_file} не найден.")
         except Exception as e:
             self.log_error(f"Произошла ошибка при загрузке весов: {e}")
 
+    @property
+    def network_structure(self):
+        # Структура сети строится только по запросу, а не хранится второй копией весов
+        return network_structure(self.weights_file, self.layers, self.layer_numbers)
+
     def load_dataset(self):
+        # Выборка хранится двумя матрицами, чтобы пакет примеров обрабатывался умножением матриц
+        if self.stream:
+            self.load_dataset_stream()
+            return
+        inputs_rows, outputs_rows = [], []
         try:
             with open(self.dataset_file, 'r', encoding='utf-8') as file:
                 for line_number, line in enumerate(file, start=1):
@@ -61,68 +389,158 @@ class NeuralNetwork:
                     if not line:
                         continue
                     try:
-                        inputs, outputs = line.split("->")
-                        x = [float(i) for i in inputs.strip().split(",")]
-                        y = [float(o) for o in outputs.strip().split(",")]
-                        self.dataset.append((np.array(x), np.array(y)))
+                        x, y = parse_dataset_line(line)
+                        if inputs_rows and (len(x), len(y)) != (len(inputs_rows[0]), len(outputs_rows[0])):
+                            raise ValueError("размерность не совпадает с первой строкой")
+                        inputs_rows.append(x)
+                        outputs_rows.append(y)
                     except Exception:
                         self.log_error(f"Строка {line_number}: некорректный формат строки обучающей выборки: '{line}'")
+            if inputs_rows:
+                self.X = np.array(inputs_rows, dtype=self.dtype)
+                self.Y = np.array(outputs_rows, dtype=self.dtype)
         except FileNotFoundError:
             self.log_error(f"Файл {self.dataset_file} не найден.")
         except Exception as e:
             self.log_error(f"Произошла ошибка при загрузке обучающей выборки: {e}")
 
-    def activation_function(self, x):
-        return 1 / (1 + np.exp(-x))  # Сигмоид
-
-    def activation_derivative(self, x):
-        return x * (1 - x)  # Производная сигмоида
-
-    def forward_pass(self, inputs):
-        activations = [inputs]
-        for layer in self.layers:
-            inputs = self.activation_function(np.dot(inputs, layer.T))
-            activations.append(inputs)
-        return activations
+    def load_dataset_stream(self):
+        # Текстовая выборка один раз преобразуется в двоичную матрицу рядом с исходным файлом,
+        # дальше X и Y — представления поверх mmap, и в памяти находятся только читаемые страницы
+        try:
+            self.X, self.Y = open_dataset(self.dataset_file, self.dtype, self.log_error)
+        except FileNotFoundError:
+            self.log_error(f"Файл {self.dataset_file} не найден.")
+        except Exception as e:
+            self.log_error(f"Произошла ошибка при загрузке обучающей выборки: {e}")
 
-    def backpropagate(self, activations, expected_output):
-        errors = [expected_output - activations[-1]]  # Ошибка выходного слоя
-        deltas = [errors[-1] * self.activation_derivative(activations[-1])]
+    def apply_gradients(self, gradients, batch_size):
+        # Обновление весов по среднему градиенту пакета; буферы градиентов используются на месте
+        for i in range(len(self.layers)):
+            np.multiply(gradients[i], self.learning_rate, out=gradients[i])
+            np.divide(gradients[i], batch_size, out=gradients[i])
+            self.layers[i] += gradients[i]
 
-        # Обратное распространение ошибки
-        for i in range(len(self.layers) - 1, 0, -1):
-            error = np.dot(deltas[-1], self.layers[i])  # Ошибка предыдущего слоя
-            delta = error * self.activation_derivative(activations[i])
-            errors.append(error)
-            deltas.append(delta)
+    def train_step(self, X, Y, batch):
+        # Один шаг обучения на пакете (срез или массив номеров строк X и Y); возвращает суммарную ошибку.
+        # Все промежуточные массивы берутся из заранее выделенного рабочего пространства.
+        if self.workspace is None:
+            self.workspace = TrainingWorkspace(self.layers, min(self.batch_size, len(self.X)), self.dtype,
+                                               metrics=self.metrics)
+        activations = self.workspace.forward(self.layers, X, batch)
+        gradients, error = self.workspace.backward(self.layers, activations, Y, batch)
+        self.apply_gradients(gradients, len(activations[0]))
+        return error
 
-        errors.reverse()
-        deltas.reverse()
+    def batches(self):
+        # Разбиение выборки на пакеты по batch_size примеров: тройки (X, Y, срез или номера строк).
+        # Без перемешивания пакеты — срезы без копий. При потоковом чтении перемешивание идёт
+        # через буфер-окно, чтобы не обращаться к диску в случайном порядке по одной строке.
+        if self.stream and self.shuffle:
+            yield from iter_window_batches(self.X, self.Y, self.batch_size, self.rng, self.window_rows)
+            return
+        count = len(self.X)
+        order = self.rng.permutation(count) if self.shuffle else None
+        for start in range(0, count, self.batch_size):
+            if order is None:
+                yield self.X, self.Y, slice(start, min(start + self.batch_size, count))
+            else:
+                yield self.X, self.Y, order[start:start + self.batch_size]
 
-        # Обновление весов
-        for i in range(len(self.layers)):
-            self.layers[i] += self.learning_rate * np.outer(deltas[i], activations[i])
+    def save_checkpoint(self, iteration, history):
+        # Контрольная точка: веса, число пройденных итераций, состояние генератора случайных чисел
+        # и история. Пишется во временный файл и атомарно подменяет предыдущую.
+        arrays = {f"layer_{i}": layer for i, layer in enumerate(self.layers)}
+        temporary_file = self.checkpoint_file + ".tmp"
+        try:
+            with open(temporary_file, 'wb') as file:
+                np.savez(file, iteration=np.int64(iteration), layer_count=np.int64(len(self.layers)),
+                         rng_state=np.array(json.dumps(self.rng.bit_generator.state)),
+                         history=np.array("\n".join(history)), **arrays)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_file, self.checkpoint_file)
+        except Exception as e:
+            self.log_error(f"Ошибка при сохранении контрольной точки: {e}")
 
-        return np.mean(np.abs(errors[0]))
+    def load_checkpoint(self):
+        # Восстанавливает состояние из контрольной точки; возвращает (итерация, история)
+        try:
+            with np.load(self.checkpoint_file) as checkpoint:
+                layers = [checkpoint[f"layer_{i}"].astype(self.dtype) for i in range(int(checkpoint["layer_count"]))]
+                if [layer.shape for layer in layers] != [layer.shape for layer in self.layers]:
+                    raise ValueError("формы слоёв не совпадают с файлом весов")
+                self.layers = layers
+                self.rng.bit_generator.state = json.loads(str(checkpoint["rng_state"]))
+                history = str(checkpoint["history"])
+                return int(checkpoint["iteration"]), history.split("\n") if history else []
+        except FileNotFoundError:
+            return 0, []
+        except Exception as e:
+            self.log_error(f"Ошибка при загрузке контрольной точки: {e}")
+            return 0, []
 
     def train(self, history_file):
-        history = []
-        for iteration in range(1, self.iterations + 1):
-            total_error = 0
-            for inputs, expected_output in self.dataset:
-                activations = self.forward_pass(inputs)
-                error = self.backpropagate(activations, expected_output)
-                total_error += error
+        if self.X is None:
+            self.log_error("Обучающая выборка пуста.")
+            return
+        if self.batch_size < 1:
+            self.log_error(f"Некорректный размер пакета batch_size={self.batch_size}: должен быть не меньше 1.")
+            return
 
-            average_error = total_error / len(self.dataset)
-            history.append(f"{iteration - 1}: {average_error}")
+        # При возобновлении продолжаем с итерации, сохранённой в контрольной точке
+        start, history = self.load_checkpoint() if self.resume and self.checkpoint_file else (0, [])
+        self.workspace = None
 
+        # История дописывается в файл по мере обучения; при возобновлении файл переписывается
+        # содержимым контрольной точки, чтобы отбросить строки, записанные после неё
         try:
-            with open(history_file, 'w', encoding='utf-8') as file:
-                file.write("\n".join(history))
-            print(f"История обучения успешно сохранена в {history_file}")
+            history_stream = open(history_file, 'w', encoding='utf-8')
+            history_stream.write("\n".join(history))
         except Exception as e:
             self.log_error(f"Ошибка при сохранении истории обучения: {e}")
+            history_stream = None
+
+        # При workers > 1 градиенты пакета считаются параллельно в нескольких процессах
+        trainer = ParallelTrainer(self, self.workers) if self.workers > 1 else None
+        step = trainer.step if trainer else self.train_step
+        failed = False
+        try:
+            for iteration in range(start + 1, self.iterations + 1):
+                total_error = 0
+                iteration_started = time.perf_counter() if self.metrics.enabled else 0
+                for X, Y, batch in self.batches():
+                    total_error += step(X, Y, batch)
+                if self.metrics.enabled:
+                    seconds = time.perf_counter() - iteration_started
+                    self.metrics.add_time("train.iteration", seconds)
+                    self.metrics.count("train.samples", len(self.X))
+                    self.metrics.record("train.samples_per_second", len(self.X) / seconds if seconds else 0.0)
+
+                average_error = total_error / len(self.X)
+                line = f"{iteration - 1}: {average_error}"
+                if history_stream:
+                    history_stream.write(("\n" if history else "") + line)
+                history.append(line)
+
+                if self.checkpoint_file and (iteration % self.checkpoint_every == 0 or iteration == self.iterations):
+                    if history_stream:
+                        history_stream.flush()
+                    self.save_checkpoint(iteration, history)
+        except ChildProcessError:
+            # Сбой процесса параллельного обучения уже записан в журнал ошибок
+            failed = True
+        finally:
+            if trainer:
+                trainer.close()
+            if history_stream:
+                history_stream.close()
+
+        if failed:
+            self.errors.flush()
+            print(f"Обучение прервано из-за сбоя параллельного обучения, подробности в {self.error_file}")
+        elif history_stream:
+            print(f"История обучения успешно сохранена в {history_file}")
 
 
 # python nntask5.py input1=input51.txt input2=input52.txt input3=input53.txt output1=output51.txt
@@ -132,12 +550,26 @@ def main():
     # output1 - Число итераций обучения
     # output2 - Файл с историей ошибок
     input1, input2, input3, output1, output2 = parse_args()
+    configure_from_args()
     print(f"Входные файлы: {input1}, {input2}")
     print(f"Число итераций: {input3}")
     print(f"Выходной файл: {output1}")
-    nn = NeuralNetwork(input1, input2, int(read_from_text_file(input3)))
+    # Необязательные параметры: batch_size=32 shuffle=1 seed=42 workers=8 dtype=float32
+    # checkpoint=checkpoint.npz checkpoint_every=100 resume=1 stream=1 window_rows=65536
+    batch_size = int(parse_option("batch_size", "1"))
+    shuffle = parse_option("shuffle", "0") == "1"
+    seed = parse_option("seed")
+    workers = int(parse_option("workers", "1"))
+    dtype = np.dtype(parse_option("dtype", "float64"))
+    nn = NeuralNetwork(input1, input2, int(read_from_text_file(input3)), batch_size=batch_size,
+                       shuffle=shuffle, seed=int(seed) if seed is not None else None, workers=workers,
+                       dtype=dtype, checkpoint_file=parse_option("checkpoint"),
+                       checkpoint_every=int(parse_option("checkpoint_every", "100")),
+                       resume=parse_option("resume", "0") == "1",
+                       stream=parse_option("stream", "0") == "1",
+                       window_rows=int(parse_option("window_rows", str(WINDOW_ROWS))))
     nn.train(output1)
 
 
 if __name__ == '__main__':
-    main()
+    run_with_instrumentation(main)
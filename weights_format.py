@@ -0,0 +1,138 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+WEIGHTS_SUFFIX = ".nnw"
+WEIGHTS_MAGIC = b"NNWGHT1\0"
+WEIGHTS_VERSION = 1
+HEADER_LENGTH = struct.Struct("<I")  # Длина JSON-заголовка после сигнатуры
+ALIGNMENT = 64  # Выравнивание матриц в файле: их можно читать через mmap без копирования
+
+
+def is_binary_weights(path):
+    with open(path, 'rb') as file:
+        return file.read(len(WEIGHTS_MAGIC)) == WEIGHTS_MAGIC
+
+
+def parse_weights_line(line, dtype=np.float64):
+    # Строка текстового формата — список нейронов через запятую, каждый нейрон — список весов
+    matrix = np.array(json.loads(f"[{line}]"), dtype=dtype)
+    if matrix.ndim != 2 or matrix.shape[1] == 0:
+        raise ValueError("строки матрицы разной длины")
+    return matrix
+
+
+def read_text_weights(path, dtype, log_error):
+    """
+    Чтение текстового файла весов, по одному слою в строке. Некорректные строки
+    записываются в журнал ошибок и пропускаются.
+
+    :return: (матрицы слоёв, номера строк, из которых они прочитаны)
+    """
+    layers, numbers = [], []
+    with open(path, 'r', encoding='utf-8') as file:
+        for layer_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                matrix = parse_weights_line(line, dtype)
+            except Exception:
+                log_error(f"Строка {layer_number}: некорректный формат матрицы весов '{line}'")
+                continue
+            layers.append(matrix)
+            numbers.append(layer_number)
+    return layers, numbers
+
+
+def save_binary_weights(path, layers, dtype=None):
+    """
+    Запись весов в двоичном формате: сигнатура, JSON-заголовок с формами слоёв и типом,
+    затем выровненные матрицы в порядке C. Файл пишется во временный и атомарно переименовывается.
+    """
+    dtype = np.dtype(dtype if dtype is not None else (layers[0].dtype if layers else np.float64))
+    sections = []
+    position = 0
+    for layer in layers:
+        size = layer.size * dtype.itemsize
+        sections.append({"shape": list(layer.shape), "offset": position})
+        position += size + (-size) % ALIGNMENT
+
+    header_bytes = json.dumps({"version": WEIGHTS_VERSION, "dtype": dtype.str, "layers": sections}).encode('utf-8')
+    prefix_size = len(WEIGHTS_MAGIC) + HEADER_LENGTH.size + len(header_bytes)
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'wb') as file:
+        file.write(WEIGHTS_MAGIC)
+        file.write(HEADER_LENGTH.pack(len(header_bytes)))
+        file.write(header_bytes)
+        file.write(b'\0' * ((-prefix_size) % ALIGNMENT))
+        for layer in layers:
+            data = np.ascontiguousarray(layer, dtype=dtype)
+            file.write(memoryview(data).cast('B'))
+            file.write(b'\0' * ((-data.nbytes) % ALIGNMENT))
+    os.replace(temporary_path, path)
+    return path
+
+
+def load_binary_weights(path, writable=False):
+    """
+    Отображает файл весов в память и возвращает матрицы слоёв — представления поверх mmap
+    без копирования. При writable=True отображение копируется при записи: веса можно менять
+    на месте (обучение), а файл на диске остаётся прежним.
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(WEIGHTS_MAGIC)) != WEIGHTS_MAGIC:
+            raise ValueError(f"{path} не является двоичным файлом весов")
+        (length,) = HEADER_LENGTH.unpack(file.read(HEADER_LENGTH.size))
+        header = json.loads(file.read(length).decode('utf-8'))
+        if header.get("version") != WEIGHTS_VERSION:
+            raise ValueError(f"неподдерживаемая версия файла весов: {header.get('version')}")
+        prefix_size = len(WEIGHTS_MAGIC) + HEADER_LENGTH.size + length
+        data_start = prefix_size + (-prefix_size) % ALIGNMENT
+        if not header["layers"]:
+            return []
+        # Отображение остаётся доступным после закрытия файла
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY if writable else mmap.ACCESS_READ)
+
+    dtype = np.dtype(header["dtype"])
+    layers = []
+    for section in header["layers"]:
+        shape = tuple(section["shape"])
+        layers.append(np.frombuffer(mapped, dtype=dtype, count=int(np.prod(shape)),
+                                    offset=data_start + section["offset"]).reshape(shape))
+    return layers
+
+
+def network_structure(weights_file, layers, numbers):
+    """
+    Структура сети для вывода в JSON: {"Layer N": матрица весов}. Для текстового файла
+    строки перечитываются, чтобы сохранить числа в исходном виде (целые остаются целыми);
+    для двоичного матрицы преобразуются в списки.
+    """
+    if not numbers:
+        return {}
+    if is_binary_weights(weights_file):
+        return {f"Layer {number}": layer.tolist() for number, layer in zip(numbers, layers)}
+    wanted = set(numbers)
+    structure = {}
+    with open(weights_file, 'r', encoding='utf-8') as file:
+        for layer_number, line in enumerate(file, start=1):
+            if layer_number in wanted:
+                structure[f"Layer {layer_number}"] = json.loads(f"[{line.strip()}]")
+    return structure
+
+
+def write_text_weights(path, layers):
+    # Обратное преобразование в текстовый формат: слой в строке, нейроны через запятую
+    with open(path, 'w', encoding='utf-8') as file:
+        for layer in layers:
+            file.write(", ".join(json.dumps(row) for row in layer.tolist()) + "\n")
+
+
+def write_structure_json(path, structure):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(structure, file, ensure_ascii=False, indent=4)